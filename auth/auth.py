@@ -1,24 +1,26 @@
-import secrets
-from datetime import date, datetime
-from typing import List
+from datetime import date, datetime, timedelta
+from typing import List, Union
 
-import aiofiles
-from fastapi import APIRouter, HTTPException, UploadFile, Depends
+from fastapi import APIRouter, HTTPException, UploadFile, Depends, Request, Response
 from sqlalchemy import select, insert, update
-from sqlalchemy.exc import NoResultFound, MultipleResultsFound
+from sqlalchemy.exc import IntegrityError, NoResultFound, MultipleResultsFound
 from sqlalchemy.ext.asyncio import AsyncSession
-from passlib.context import CryptContext
 
-from database import get_async_session
+from config import REFRESH_TOKEN_DAYS
+from database import get_async_session, get_read_session
 from .scheme import User_Phone, UserLogin, UserData_2, University_list, faculty_list, district_list, region_list, \
-    UserData_info, RenterData, RenterData_info, change_password
-from models.models import User, Renter, University, Faculty, District, Region
-from .utils import generate_token, verify_token, generate_token_renter, verify_renter_token
+    UserData_info, RenterData, RenterData_info, change_password, RefreshToken
+from models.models import User, Renter
+from storage.derivatives import schedule_derivatives
+from storage.store import store_upload
+from .hashing import hash_password, verify_password
+from .reference import reference_cache
+from .revocation import revocation_list
+from .utils import generate_token, verify_token, generate_token_renter, verify_renter_token, verify_stuff_token, \
+    verify_access_token, decode_refresh_token, refresh_tokens
 
 auth_router = APIRouter()
 
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
-
 user_data = {}  # Initialize user_data dictionary
 
 
@@ -52,10 +54,13 @@ async def reset_password(phone: str,
             res = await session.execute(query)
             result = res.scalars().one_or_none()
             if result:
-                hash_password = pwd_context.hash(password_2)
-                query_update = update(User).where(User.phone == phone).values(password=hash_password)
+                password_hash = await hash_password(password_2)
+                query_update = update(User).where(User.phone == phone).values(password=password_hash)
                 await session.execute(query_update)
+                revoked = await revocation_list.revoke_subject(session, f'user:{result.id}',
+                                                               datetime.utcnow() + timedelta(days=REFRESH_TOKEN_DAYS))
                 await session.commit()
+                revocation_list.apply(revoked)
                 return HTTPException(status_code=200, detail="Password updated")
             else:
                 raise HTTPException(status_code=400, detail="User does not exist")
@@ -76,11 +81,14 @@ async def reset_password(phone: str,
             res = await session.execute(query)
             result = res.scalars().one_or_none()
             if result:
-                hash_password = pwd_context.hash(password_2)
-                query_update = update(Renter).where(Renter.phone == phone).values(password=hash_password)
-                token = generate_token_renter(result.id)
+                password_hash = await hash_password(password_2)
+                query_update = update(Renter).where(Renter.phone == phone).values(password=password_hash)
                 await session.execute(query_update)
+                revoked = await revocation_list.revoke_subject(session, f'renter:{result.id}',
+                                                               datetime.utcnow() + timedelta(days=REFRESH_TOKEN_DAYS))
+                token = generate_token_renter(result.id)
                 await session.commit()
+                revocation_list.apply(revoked)
 
                 return token
             else:
@@ -111,23 +119,19 @@ async def register_user(image: UploadFile,
                         session: AsyncSession = Depends(get_async_session)):
     try:
         if password1 == password2:
-            name = image.filename
-            out_file = f'images/{name}'
-            async with aiofiles.open(out_file, 'wb') as zipf:
-                content = await image.read()
-                await zipf.write(content)
-            hashcode = secrets.token_hex(32)
-            hashed_password = pwd_context.hash(password2)
+            stored = await store_upload(session, image)
+            hashed_password = await hash_password(password2)
             query = insert(User).values(firstname=firstname,
                                         lastname=lastname,
                                         phone=phone,
                                         jins_id=jins_id,
                                         password=hashed_password,
                                         invisible=invisible,
-                                        image=hashcode,
+                                        image=stored.sha256,
                                         register_at=datetime.utcnow())
             await session.execute(query)
             await session.commit()
+            schedule_derivatives(stored.path, stored.sha256)
             return HTTPException(status_code=200, detail="Saved!")
     except Exception as e:
         return HTTPException(status_code=500, detail=f"{e}")
@@ -161,21 +165,17 @@ async def register_user_student(image: UploadFile,
                                 session: AsyncSession = Depends(get_async_session)):
     try:
         if password_1 == password_2:
-            password_hash = pwd_context.hash(password_2)
-            name = image.filename
-            out_file = f'images/{name}'
-            async with aiofiles.open(out_file, 'wb') as zipf:
-                content = await image.read()
-                await zipf.write(content)
-            hashcode = secrets.token_hex(32)
+            password_hash = await hash_password(password_2)
+            stored = await store_upload(session, image)
             query = insert(Renter).values(firstname=first_name,
                                           lastname=last_name,
                                           phone=phone,
                                           password=password_hash,
-                                          image=hashcode,
+                                          image=stored.sha256,
                                           register_at=datetime.utcnow())
             await session.execute(query)
             await session.commit()
+            schedule_derivatives(stored.path, stored.sha256)
             return HTTPException(status_code=200, detail="Registered!")
         else:
             return HTTPException(status_code=400, detail="Passwords are not same!")
@@ -191,9 +191,13 @@ async def login(user: UserLogin, session: AsyncSession = Depends(get_async_sessi
         res_user = await session.execute(query_user)
 
         user_result = res_user.scalar_one_or_none()
+        valid, new_hash = await verify_password(user.password, user_result.password) if user_result else (False, None)
 
-        if user_result and pwd_context.verify(user.password, user_result.password):
+        if valid:
             token = generate_token(user_result.id, user_result.jins_id)
+            if new_hash:
+                await session.execute(update(User).where(User.id == user_result.id).values(password=new_hash))
+                await session.commit()
             print('User')
             return {"status_code": 200, "detail": token}
         else:
@@ -212,9 +216,13 @@ async def login(user: UserLogin, session: AsyncSession = Depends(get_async_sessi
         res_renter = await session.execute(query_renter)
 
         renter_result = res_renter.scalar_one_or_none()
+        valid, new_hash = await verify_password(user.password, renter_result.password) if renter_result else (False, None)
 
-        if renter_result and pwd_context.verify(user.password, renter_result.password):
+        if valid:
             token = generate_token_renter(renter_result.id)
+            if new_hash:
+                await session.execute(update(Renter).where(Renter.id == renter_result.id).values(password=new_hash))
+                await session.commit()
             print('Renter')
             return {"status_code": 200, "detail": token}
         else:
@@ -227,57 +235,112 @@ async def login(user: UserLogin, session: AsyncSession = Depends(get_async_sessi
     #     return HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
 
 
+@auth_router.post('/refresh')
+async def refresh(model: RefreshToken, session: AsyncSession = Depends(get_async_session)):
+    payload = decode_refresh_token(model.refresh_token)
+    # rotation: the refresh token that was just used cannot be used again
+    try:
+        revoked = await revocation_list.revoke(session, payload['jti'], datetime.utcfromtimestamp(payload['exp']))
+        await session.commit()
+    except IntegrityError:
+        # a concurrent refresh, here or in a worker that has not polled it yet, rotated it first
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    revocation_list.apply(revoked)
+    token = refresh_tokens(payload)
+    return {"status_code": 200, "detail": token}
+
+
+@auth_router.post('/logout')
+async def logout(model: Union[RefreshToken, None] = None,
+                 token: dict = Depends(verify_access_token),
+                 session: AsyncSession = Depends(get_async_session)):
+    # an expired or already rotated refresh token fails here, before anything is written
+    payloads = [token] if model is None else [token, decode_refresh_token(model.refresh_token)]
+    try:
+        revoked = [await revocation_list.revoke(session, payload['jti'], datetime.utcfromtimestamp(payload['exp']))
+                   for payload in payloads]
+        await session.commit()
+    except IntegrityError:
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    revocation_list.apply(*revoked)
+    return HTTPException(status_code=200, detail="Logged out")
+
+
 @auth_router.get('/get_university/', response_model=List[University_list])
-async def get_university(session: AsyncSession = Depends(get_async_session)):
+async def get_university(request: Request,
+                         response: Response,
+                         session: AsyncSession = Depends(get_read_session)):
     try:
-        query = select(University)
-        res = await session.execute(query)
-        result = res.scalars().all()
-        return result
+        await reference_cache.ensure(session)
+        not_modified = reference_cache.not_modified(request)
+        if not_modified:
+            return not_modified
+        response.headers.update(reference_cache.headers())
+        return reference_cache.universities
     except Exception as e:
         return HTTPException(status_code=500, detail=f"{e}")
 
 
 @auth_router.get('/get_faculty/', response_model=List[faculty_list])
 async def get_faculty(university_id: int,
-                      session: AsyncSession = Depends(get_async_session)
+                      request: Request,
+                      response: Response,
+                      session: AsyncSession = Depends(get_read_session)
                       ):
     try:
-        query = select(Faculty).where(Faculty.university_id == university_id)
-        res = await session.execute(query)
-        result = res.scalars().all()
-        return result
+        await reference_cache.ensure(session)
+        not_modified = reference_cache.not_modified(request)
+        if not_modified:
+            return not_modified
+        response.headers.update(reference_cache.headers())
+        return reference_cache.faculties.get(university_id, [])
     except Exception as e:
         return HTTPException(status_code=500, detail=f"{e}")
 
 
 @auth_router.get('/get_region/', response_model=List[region_list])
-async def get_regions(session: AsyncSession = Depends(get_async_session)):
+async def get_regions(request: Request,
+                      response: Response,
+                      session: AsyncSession = Depends(get_read_session)):
     try:
-        query = select(Region)
-        res = await session.execute(query)
-        result = res.scalars().all()
-        return result
+        await reference_cache.ensure(session)
+        not_modified = reference_cache.not_modified(request)
+        if not_modified:
+            return not_modified
+        response.headers.update(reference_cache.headers())
+        return reference_cache.regions
     except Exception as e:
         return HTTPException(status_code=500, detail=f"{e}")
 
 
 @auth_router.get('/get_district/', response_model=List[district_list])
 async def get_ditrict(region_id: int,
-                      session: AsyncSession = Depends(get_async_session)
+                      request: Request,
+                      response: Response,
+                      session: AsyncSession = Depends(get_read_session)
                       ):
     try:
-        query = select(District).where(District.region_id == region_id)
-        res = await session.execute(query)
-        result = res.scalars().all()
-        return result
+        await reference_cache.ensure(session)
+        not_modified = reference_cache.not_modified(request)
+        if not_modified:
+            return not_modified
+        response.headers.update(reference_cache.headers())
+        return reference_cache.districts.get(region_id, [])
     except Exception as e:
         return HTTPException(status_code=500, detail=f"{e}")
 
 
+@auth_router.post('/reference/invalidate/')
+async def invalidate_reference(token: dict = Depends(verify_stuff_token),
+                               session: AsyncSession = Depends(get_async_session)):
+    reference_cache.invalidate()
+    await reference_cache.ensure(session)
+    return {'etag': reference_cache.etag}
+
+
 @auth_router.get("/student/user_info", response_model=UserData_info)
 async def get_user_info(token: dict = Depends(verify_token),
-                        session: AsyncSession = Depends(get_async_session)):
+                        session: AsyncSession = Depends(get_read_session)):
     try:
         user_id = token.get('user_id')
         query = select(User).where(User.id == user_id)
@@ -290,7 +353,7 @@ async def get_user_info(token: dict = Depends(verify_token),
 
 @auth_router.get("/renter/user_info", response_model=RenterData_info)
 async def get_user_info(token: dict = Depends(verify_renter_token),
-                        session: AsyncSession = Depends(get_async_session)):
+                        session: AsyncSession = Depends(get_read_session)):
     try:
         user_id = token.get('renter_id')
         query = select(Renter).where(Renter.id == user_id)
@@ -309,12 +372,12 @@ async def change_password_user(model:change_password,
     try:
         if model.new_password==model.confirm_password:
             user_id = token.get('user_id')
-            password_hash = pwd_context.hash(model.old_password)
             query = select(User).where(User.id==user_id)
             res = await session.execute(query)
             result = res.scalar()
-            if result and pwd_context.verify(model.old_password, result.password):
-                new_password_hash= pwd_context.hash(model.confirm_password)
+            valid, _ = await verify_password(model.old_password, result.password) if result else (False, None)
+            if valid:
+                new_password_hash = await hash_password(model.confirm_password)
                 query_update = update(User).where(User.id==user_id).values(password=new_password_hash)
                 await session.execute(query_update)
                 await session.commit()
@@ -341,8 +404,9 @@ async def change_password_renter(model:change_password,
             res = await session.execute(query)
             renter = res.scalar()
 
-            if renter and pwd_context.verify(model.old_password, renter.password):
-                new_password_hash = pwd_context.hash(model.confirm_password)
+            valid, _ = await verify_password(model.old_password, renter.password) if renter else (False, None)
+            if valid:
+                new_password_hash = await hash_password(model.confirm_password)
                 query_update = update(Renter).where(Renter.id == user_id).values(password=new_password_hash)
                 await session.execute(query_update)
                 await session.commit()
@@ -0,0 +1,27 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from passlib.context import CryptContext
+
+from config import BCRYPT_ROUNDS, PASSWORD_HASH_WORKERS
+
+# min and max pinned to the same cost, so any stored hash with another cost is flagged for rehash
+pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto',
+                           bcrypt__rounds=BCRYPT_ROUNDS,
+                           bcrypt__min_rounds=BCRYPT_ROUNDS,
+                           bcrypt__max_rounds=BCRYPT_ROUNDS)
+
+# bcrypt releases the GIL, so a small thread pool keeps the event loop free and caps the CPU spent on hashing
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix='bcrypt')
+
+
+async def hash_password(password: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, pwd_context.hash, password)
+
+
+async def verify_password(password: str, hashed):
+    """Returns (valid, new_hash); new_hash is set when the stored hash used another cost."""
+    if not hashed:
+        return False, None
+    return await asyncio.get_running_loop().run_in_executor(
+        _executor, pwd_context.verify_and_update, password, hashed)
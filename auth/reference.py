@@ -0,0 +1,75 @@
+import asyncio
+import hashlib
+import json
+import time
+
+from fastapi import Request, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import REFERENCE_CACHE_TTL
+from models.models import University, Faculty, Region, District
+
+
+def _rows(result) -> list:
+    return [dict(row._mapping) for row in result]
+
+
+class ReferenceCache:
+    """Universities, faculties, regions and districts, held per process.
+
+    The ETag is a digest of the data, so every worker hands out the same one for the same rows.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self.universities = []
+        self.faculties = {}
+        self.regions = []
+        self.districts = {}
+        self.etag = None
+        self.loaded_at = None
+        self._lock = asyncio.Lock()
+
+    def _fresh(self) -> bool:
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    async def load(self, session: AsyncSession):
+        universities = _rows(await session.execute(select(*University.__table__.c).order_by(University.id)))
+        faculties = _rows(await session.execute(select(*Faculty.__table__.c).order_by(Faculty.id)))
+        regions = _rows(await session.execute(select(*Region.__table__.c).order_by(Region.id)))
+        districts = _rows(await session.execute(select(*District.__table__.c).order_by(District.id)))
+
+        faculties_by_university, districts_by_region = {}, {}
+        for faculty in faculties:
+            faculties_by_university.setdefault(faculty['university_id'], []).append(faculty)
+        for district in districts:
+            districts_by_region.setdefault(district['region_id'], []).append(district)
+
+        digest = hashlib.sha1(json.dumps([universities, faculties, regions, districts], sort_keys=True).encode())
+        self.universities, self.faculties = universities, faculties_by_university
+        self.regions, self.districts = regions, districts_by_region
+        self.etag = f'"ref-{digest.hexdigest()[:16]}"'
+        self.loaded_at = time.monotonic()
+
+    async def ensure(self, session: AsyncSession):
+        if self._fresh():
+            return
+        async with self._lock:
+            if not self._fresh():
+                await self.load(session)
+
+    def headers(self) -> dict:
+        return {'ETag': self.etag, 'Cache-Control': 'no-cache'}
+
+    def not_modified(self, request: Request):
+        if request.headers.get('if-none-match') == self.etag:
+            return Response(status_code=304, headers=self.headers())
+        return None
+
+    def invalidate(self):
+        # the next request reloads; other workers pick the change up within the TTL
+        self.loaded_at = None
+
+
+reference_cache = ReferenceCache(REFERENCE_CACHE_TTL)
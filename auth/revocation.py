@@ -0,0 +1,104 @@
+import asyncio
+import calendar
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import REVOCATION_REFRESH_SECONDS
+from database import async_session_maker
+from models.models import RevokedToken
+
+# rows committed by another worker while we were reading are picked up on the next pass
+OVERLAP = timedelta(seconds=60)
+PURGE_EVERY = timedelta(hours=1)
+
+
+def _timestamp(value: datetime) -> int:
+    return calendar.timegm(value.utctimetuple())
+
+
+def subject_key(payload: dict):
+    for claim, prefix in (('user_id', 'user'), ('renter_id', 'renter'), ('stuff_id', 'stuff')):
+        if payload.get(claim):
+            return f'{prefix}:{payload[claim]}'
+    return None
+
+
+class RevocationList:
+    """Revoked jtis and subjects mirrored from the revoked_token table.
+
+    Lookups are dict hits on the request path; the table is polled for new rows in the background.
+    """
+
+    def __init__(self):
+        self.revoked = {}
+        self.checked_at = None
+        self.purged_at = None
+
+    def _add(self, key: str, revoked_at: datetime, expires_at: datetime):
+        old_revoked, old_expires = self.revoked.get(key, (0, 0))
+        self.revoked[key] = (max(old_revoked, _timestamp(revoked_at)), max(old_expires, _timestamp(expires_at)))
+
+    def is_revoked(self, payload: dict) -> bool:
+        if not self.revoked:
+            return False
+        if payload.get('jti') in self.revoked:
+            return True
+        entry = self.revoked.get(subject_key(payload))
+        return entry is not None and payload.get('iat', 0) < entry[0]
+
+    async def revoke(self, session: AsyncSession, jti: str, expires_at: datetime) -> tuple:
+        """Adds the row to the caller's transaction; hand the result to apply() once it has committed.
+
+        Applied earlier, a rolled back revocation would still hold in this worker and nowhere else.
+        jti is unique in the table, so of two requests revoking the same token, in any worker, the
+        second fails with IntegrityError.
+        """
+        revoked_at = datetime.utcnow()
+        await session.execute(insert(RevokedToken).values(jti=jti, revoked_at=revoked_at, expires_at=expires_at))
+        return jti, revoked_at, expires_at
+
+    async def revoke_subject(self, session: AsyncSession, key: str, expires_at: datetime) -> tuple:
+        """Like revoke() for every token of a subject; revoking it again moves the existing row forward."""
+        revoked_at = datetime.utcnow()
+        statement = insert(RevokedToken).values(jti=key, revoked_at=revoked_at, expires_at=expires_at)
+        await session.execute(statement.on_conflict_do_update(
+            index_elements=[RevokedToken.jti],
+            set_={'revoked_at': statement.excluded.revoked_at,
+                  'expires_at': func.greatest(RevokedToken.expires_at, statement.excluded.expires_at)}))
+        return key, revoked_at, expires_at
+
+    def apply(self, *entries):
+        for key, revoked_at, expires_at in entries:
+            self._add(key, revoked_at, expires_at)
+
+    async def refresh(self, session: AsyncSession):
+        now = datetime.utcnow()
+        query = select(RevokedToken.jti, RevokedToken.revoked_at, RevokedToken.expires_at).where(
+            RevokedToken.expires_at > now)
+        if self.checked_at is not None:
+            query = query.where(RevokedToken.revoked_at >= self.checked_at - OVERLAP)
+        for key, revoked_at, expires_at in await session.execute(query):
+            self._add(key, revoked_at, expires_at)
+        self.checked_at = now
+
+        if self.purged_at is None or now - self.purged_at > PURGE_EVERY:
+            await session.execute(delete(RevokedToken).where(RevokedToken.expires_at <= now))
+            await session.commit()
+            # once every token it covers has expired, jwt.decode rejects them without our help
+            self.revoked = {key: entry for key, entry in self.revoked.items() if entry[1] > _timestamp(now)}
+            self.purged_at = now
+
+    async def run(self):
+        while True:
+            try:
+                async with async_session_maker() as session:
+                    await self.refresh(session)
+            except Exception as e:
+                print(f'Revocation list refresh failed: {e}')
+            await asyncio.sleep(REVOCATION_REFRESH_SECONDS)
+
+
+revocation_list = RevocationList()
@@ -44,6 +44,10 @@ class UserLogin(BaseModel):
     password:str
 
 
+class RefreshToken(BaseModel):
+    refresh_token: str
+
+
 class University_list(BaseModel):
     id:int
     name:str
@@ -1,3 +1,4 @@
+import hashlib
 import os
 import jwt
 import secrets
@@ -6,28 +7,32 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials, OAuth2Pas
 from fastapi import Depends, HTTPException
 from dotenv import load_dotenv
 
+from cache import LRUCache
+from config import TOKEN_CACHE_SIZE, ACCESS_TOKEN_MINUTES, REFRESH_TOKEN_DAYS
+from .revocation import revocation_list, subject_key
+
 load_dotenv()
 secret_key = os.environ.get('SECRET')
 algorithm = 'HS256'
 security = HTTPBearer()
+token_cache = LRUCache(TOKEN_CACHE_SIZE)
 
 
-def generate_token(user_id: int,jins_id:int):
-    jti_access = str(secrets.token_urlsafe(32))
-    jti_refresh = str(secrets.token_urlsafe(32))
+def _token_pair(claims: dict):
+    now = datetime.utcnow()
     data_access_token = {
         'token_type': 'access',
-        'exp': datetime.utcnow() + timedelta(minutes=30),
-        'user_id': user_id,
-        'jins_id': jins_id,
-        'jti':jti_access
+        'iat': now,
+        'exp': now + timedelta(minutes=ACCESS_TOKEN_MINUTES),
+        **claims,
+        'jti': str(secrets.token_urlsafe(32))
     }
     data_refresh_token = {
         'token_type': 'refresh',
-        'exp': datetime.utcnow() + timedelta(minutes=30),
-        'user_id': user_id,
-        'jins_id': jins_id,
-        'jti': jti_refresh
+        'iat': now,
+        'exp': now + timedelta(days=REFRESH_TOKEN_DAYS),
+        **claims,
+        'jti': str(secrets.token_urlsafe(32))
     }
     access_token = jwt.encode(data_access_token, secret_key, algorithm)
     refresh_token = jwt.encode(data_refresh_token, secret_key, algorithm)
@@ -38,109 +43,79 @@ def generate_token(user_id: int,jins_id:int):
     }
 
 
+def generate_token(user_id: int,jins_id:int):
+    return _token_pair({'user_id': user_id, 'jins_id': jins_id})
+
+
 def generate_token_renter(renter_id: int):
-    jti_access = str(secrets.token_urlsafe(32))
-    jti_refresh = str(secrets.token_urlsafe(32))
-    data_access_token = {
-        'token_type': 'access',
-        'exp': datetime.utcnow() + timedelta(minutes=30),
-        'renter_id': renter_id,
-        'jti':jti_access
-    }
-    data_refresh_token = {
-        'token_type':'refresh',
-        'exp': datetime.utcnow() + timedelta(minutes=30),
-        'renter_id':renter_id,
-        'jti':jti_refresh
-    }
-    access_token = jwt.encode(data_access_token,secret_key,algorithm)
-    refresh_token = jwt.encode(data_refresh_token,secret_key,algorithm)
+    return _token_pair({'renter_id': renter_id})
 
-    return {
-     'access_token': access_token,
-     'refresh_token': refresh_token
-    }
 
 def generate_token_stuff(stuff_id: int,role_id:int):
-    jti_access = str(secrets.token_urlsafe(32))
-    jti_refresh = str(secrets.token_urlsafe(32))
-    data_access_token = {
-        'token_type': 'access',
-        'exp': datetime.utcnow() + timedelta(minutes=30),
-        'stuff_id': stuff_id,
-        'role_id': role_id,
-        'jti':jti_access
-    }
-    data_refresh_token = {
-        'token_type':'refresh',
-        'exp': datetime.utcnow() + timedelta(minutes=30),
-        'stuff_id':stuff_id,
-        'role_id':role_id,
-        'jti':jti_refresh
-    }
-    access_token = jwt.encode(data_access_token,secret_key,algorithm)
-    refresh_token = jwt.encode(data_refresh_token,secret_key,algorithm)
-
-    return {
-     'access_token': access_token,
-     'refresh_token': refresh_token
-    }
+    return _token_pair({'stuff_id': stuff_id, 'role_id': role_id})
 
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+def decode_refresh_token(refresh_token: str) -> dict:
     try:
-        token = credentials.credentials
-        secret_key = os.environ.get('SECRET')
-
-        payload =jwt.decode(token, secret_key,algorithms=['HS256'])
-        try:
-            user_id = payload['user_id']
-            if user_id:
-                return payload
-            else:
-                raise HTTPException(status_code=401, detail='Not allowed')
-        except KeyError:
-            raise HTTPException(status_code=401, detail='Not allowed')
+        payload = _decode(refresh_token)
     except jwt.ExpiredSignatureError:
-        return HTTPException(status_code=401, detail="Token has expired")
+        raise HTTPException(status_code=401, detail="Token has expired")
     except jwt.InvalidTokenError:
-        return HTTPException(status_code=401, detail="Invalid token")
-
-
-def verify_renter_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get('token_type') != 'refresh':
+        raise HTTPException(status_code=401, detail="Invalid token")
+    if revocation_list.is_revoked(payload):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    return payload
+
+
+def refresh_tokens(payload: dict):
+    if payload.get('user_id'):
+        return generate_token(payload['user_id'], payload.get('jins_id'))
+    if payload.get('renter_id'):
+        return generate_token_renter(payload['renter_id'])
+    if payload.get('stuff_id'):
+        return generate_token_stuff(payload['stuff_id'], payload.get('role_id'))
+    raise HTTPException(status_code=401, detail='Not allowed')
+
+
+def _decode(token: str) -> dict:
+    key = hashlib.sha256(token.encode()).digest()
+    payload = token_cache.get(key)
+    if payload is None:
+        payload = jwt.decode(token, secret_key, algorithms=[algorithm])
+        if payload.get('exp'):
+            # the entry dies with the token, so an expired token is never served from the cache
+            token_cache.set(key, payload, expires_at=payload['exp'])
+    return payload
+
+
+def _verify(credentials: HTTPAuthorizationCredentials, claim: str = None) -> dict:
     try:
-        token = credentials.credentials
-        secret_key = os.environ.get('SECRET')
-
-        payload =jwt.decode(token, secret_key,algorithms=['HS256'])
-        try:
-            if payload['renter_id']:
-                return payload
-            else:
-                raise HTTPException(status_code=401, detail='Not allowed')
-        except KeyError:
-            raise HTTPException(status_code=401, detail='Not allowed')
+        payload = _decode(credentials.credentials)
     except jwt.ExpiredSignatureError:
-        return HTTPException(status_code=401, detail="Token has expired")
+        raise HTTPException(status_code=401, detail="Token has expired")
     except jwt.InvalidTokenError:
-        return HTTPException(status_code=401, detail="Invalid token")
+        raise HTTPException(status_code=401, detail="Invalid token")
+    subject = payload.get(claim) if claim else subject_key(payload)
+    if payload.get('token_type') != 'access' or not subject:
+        raise HTTPException(status_code=401, detail='Not allowed')
+    if revocation_list.is_revoked(payload):
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    return payload
 
 
-def verify_stuff_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        token = credentials.credentials
-        secret_key = os.environ.get('SECRET')
-
-        payload =jwt.decode(token, secret_key,algorithms=['HS256'])
-        try:
-            if payload['stuff_id']:
-                return payload
-            else:
-                raise HTTPException(status_code=401, detail='Not allowed')
-        except KeyError:
-            raise HTTPException(status_code=401, detail='Not allowed')
-    except jwt.ExpiredSignatureError:
-        return HTTPException(status_code=401, detail="Token has expired")
-    except jwt.InvalidTokenError:
-        return HTTPException(status_code=401, detail="Invalid token")
+async def verify_access_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return _verify(credentials)
+
+
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return _verify(credentials, 'user_id')
+
+
+async def verify_renter_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return _verify(credentials, 'renter_id')
+
 
+async def verify_stuff_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return _verify(credentials, 'stuff_id')
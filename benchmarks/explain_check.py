@@ -0,0 +1,160 @@
+# Runs EXPLAIN on the hot router queries against a seeded database and exits non-zero
+# when any of them plans a sequential scan on one of the large tables.
+# The queries are built the way the handlers build them. COUNT(*) for the OFFSET pages
+# is left out, it reads the whole gender slice by design.
+# Runs in a rolled-back transaction.
+#
+#   python -m benchmarks.explain_check 20000
+import asyncio
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, insert, select, text
+
+from database import engine
+from mobile.filters import filter_rents
+from mobile.projection import rent_projection
+from mobile.search import filter_search, rank_search
+from mobile.utils import order_rents, seek_rents, encode_cursor
+from mobile.wishlist import TOGGLE, wishlist_cards
+from mobile.scheme import FilterScheme
+from models.models import (RENT_AMENITIES, Category, District, Faculty, Image, Jins, Rate, Region, Rent, RentDistance,
+                           Renter, StoredFile, University, User, Wishlist)
+
+# below this many rows a scan is often the right plan (jins, category)
+LARGE_TABLE_ROWS = 10000
+PAGE = 10
+KINDS = ['Kvartira', 'Uy', 'Xona', 'Studiya', 'Kottej', 'Yotoqxona']
+PLACES = ['Chilonzor', 'Yunusobod', 'Sergeli', 'Mirzo Ulugbek', 'Yakkasaroy', 'Shayxontohur', 'Olmazor', 'Bektemir',
+          'Mirobod', 'Uchtepa', 'Yashnobod', 'Qoraqamish', 'Beruniy', 'Oqtepa', 'Buyuk Ipak Yoli', 'Minor']
+
+
+def seq_scans(plan: dict, large: set, hashed: bool = False) -> list:
+    # an unfiltered scan under a Hash node builds a hash join (renter for a whole search ranking), no index would help
+    found = []
+    if plan.get('Node Type') == 'Seq Scan' and plan.get('Relation Name') in large and not (hashed and 'Filter' not in plan):
+        found.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        found += seq_scans(child, large, plan.get('Node Type') == 'Hash')
+    return found
+
+
+def hot_queries(ids: dict) -> list:
+    jins_id, rent_id, user_id, renter_id = ids['jins'], ids['rent'], ids['user'], ids['renter']
+    feed = rent_projection().where(Rent.student_jins_id == jins_id)
+    cursor_row = type('Row', (), {'created_at': datetime.now() - timedelta(days=30), 'id': rent_id,
+                                  'total_price': 400})
+    return [
+        ('mobile /rent new', order_rents(feed, 'new').offset(PAGE * 5).limit(PAGE)),
+        ('mobile /rent price', order_rents(feed, 'price').offset(PAGE * 5).limit(PAGE)),
+        ('mobile /rent/cursor', order_rents(seek_rents(feed, 'new', encode_cursor('new', cursor_row)), 'new')
+         .limit(PAGE + 1)),
+        ('mobile /rent/nearby', rent_projection(RentDistance.distance).join(RentDistance, RentDistance.rent_id == Rent.id)
+         .where(RentDistance.faculty_id == ids['faculty'], RentDistance.student_jins_id == jins_id,
+                RentDistance.distance <= 3).order_by(RentDistance.distance, Rent.id).limit(PAGE)),
+        ('mobile /rent_by_id', rent_projection().where(and_(Rent.id == rent_id, Rent.student_jins_id == jins_id))),
+        ('mobile /home/filters-news', feed.where(Rent.created_at >= datetime.now() - timedelta(days=3))
+         .order_by(Rent.created_at, Rent.id)),
+        ('mobile /search-rents', rank_search(filter_search(feed, 'studiya chilonzor'), 'studiya chilonzor')
+         .limit(PAGE)),
+        ('mobile /rent/filter', order_rents(filter_rents(feed, FilterScheme(
+            amenities=list(RENT_AMENITIES), from_price=200, end_price=600)), 'new').limit(PAGE)),
+        ('mobile /image', select(Image.url).where(Image.hashcode == ids['hashcode']).limit(1)),
+        ('mobile /get_rents/get-review', select(Rate).where(Rate.rent_id == rent_id)),
+        # plain EXPLAIN plans the DELETE and INSERT without running them
+        ('mobile /add-wishlist', TOGGLE.bindparams(user_id=user_id, rent_id=rent_id)),
+        ('mobile /get-wishlist', wishlist_cards(user_id).where(Wishlist.id < ids['wishlist']).order_by(
+            Wishlist.id.desc()).limit(PAGE + 1)),
+        ('auth /student/login', select(User).where(User.phone == ids['phone'])),
+        ('auth /renter/login', select(Renter).where(Renter.phone == ids['renter_phone'])),
+        ('auth faculties of a university', select(Faculty).where(Faculty.university_id == ids['university'])),
+        ('auth districts of a region', select(District).where(District.region_id == ids['region'])),
+        ('renter /renter/get_rents', select(Rent.id, Rent.name, Renter.firstname).join(
+            Renter, Renter.id == Rent.renter_id).where(Rent.renter_id == renter_id)),
+        ('storage release_file', select(StoredFile.refcount).where(StoredFile.sha256 == ids['hashcode'])),
+    ]
+
+
+async def seed(conn, count: int) -> dict:
+    rnd = random.Random(11)
+    now = datetime.now()
+    jins = (await conn.execute(insert(Jins).returning(Jins.id), [{'name_uz': 'bench'}, {'name_uz': 'bench'}])).scalars().all()
+    category_id = (await conn.execute(insert(Category).values(name_uz='bench').returning(Category.id))).scalar()
+    region_id = (await conn.execute(insert(Region).values(name_uz='bench').returning(Region.id))).scalar()
+    await conn.execute(insert(District), [{'name_uz': 'bench', 'region_id': region_id}] * 20)
+    university_id = (await conn.execute(insert(University).values(
+        name_uz='bench', latitude=41.3, longitude=69.28).returning(University.id))).scalar()
+    faculties = (await conn.execute(insert(Faculty).returning(Faculty.id), [
+        {'name_uz': 'bench', 'university_id': university_id, 'latitude': 41.3, 'longitude': 69.28}] * 5)).scalars().all()
+    renters = (await conn.execute(insert(Renter).returning(Renter.id), [
+        {'firstname': 'bench', 'phone': f'+99890{i:07}', 'password': 'x'} for i in range(count)])).scalars().all()
+    users = (await conn.execute(insert(User).returning(User.id), [
+        {'firstname': 'bench', 'phone': f'+99891{i:07}', 'jins_id': rnd.choice(jins), 'password': 'x'}
+        for i in range(count)])).scalars().all()
+    rents = []
+    for start in range(0, count, 5000):
+        rents += (await conn.execute(insert(Rent).returning(Rent.id), [
+            {'name': f'{rnd.choice(KINDS)} {rnd.choice(PLACES)} {i}', 'description': 'bench ' * 30,
+             'category_id': category_id, 'room_count': rnd.randint(1, 4), 'total_price': rnd.randint(100, 900),
+             'student_jins_id': rnd.choice(jins), 'student_count': 2, 'renter_id': rnd.choice(renters),
+             'location': 'Toshkent', 'latitude': 41.3 + rnd.uniform(-0.1, 0.1),
+             'longitude': 69.28 + rnd.uniform(-0.1, 0.1), 'created_at': now - timedelta(minutes=rnd.randint(0, 525600)),
+             **{name: rnd.random() < 0.5 for name in RENT_AMENITIES}}
+            for i in range(start, min(start + 5000, count))])).scalars().all()
+    for start in range(0, count, 5000):
+        chunk = rents[start:start + 5000]
+        await conn.execute(insert(Image), [{'rent_id': rent_id, 'url': f'images/{rent_id}-{k}.jpg',
+                                            'hashcode': f'{rent_id:060}{k:04}'} for rent_id in chunk for k in range(5)])
+        await conn.execute(insert(StoredFile), [{'sha256': f'{rent_id:060}{k:04}', 'path': f'images/{rent_id}-{k}.jpg',
+                                                 'refcount': 1} for rent_id in chunk for k in range(5)])
+        await conn.execute(insert(RentDistance), [{'rent_id': rent_id, 'faculty_id': faculty_id,
+                                                   'university_id': university_id, 'student_jins_id': jins[0],
+                                                   'distance': rnd.uniform(0, 15)}
+                                                  for rent_id in chunk for faculty_id in faculties])
+    await conn.execute(insert(Rate), [{'user_id': rnd.choice(users), 'rent_id': rnd.choice(rents), 'rate': rnd.randint(1, 5)}
+                                      for _ in range(count * 3)])
+    pairs = {(rnd.choice(users), rnd.choice(rents)) for _ in range(count * 3)}
+    wishlist = (await conn.execute(insert(Wishlist).returning(Wishlist.id), [
+        {'user_id': user_id, 'rent_id': rent_id} for user_id, rent_id in pairs])).scalars().all()
+    # bulk inserts leave the GIN indexes with a pending list autovacuum would have merged on a live table,
+    # the search query prices the index by it and flips to a scan
+    await conn.execute(text(
+        "SELECT gin_clean_pending_list(indexrelid) FROM pg_index JOIN pg_class ON pg_class.oid = indexrelid "
+        "JOIN pg_am ON pg_am.oid = relam WHERE amname = 'gin'"))
+    await conn.execute(text('ANALYZE'))
+    return {'jins': jins[0], 'rent': rents[len(rents) // 2], 'user': users[0], 'renter': renters[0],
+            'faculty': faculties[0], 'university': university_id, 'region': region_id,
+            'phone': '+998910000042', 'renter_phone': '+998900000042', 'hashcode': f'{rents[7]:060}0001',
+            'wishlist': wishlist[len(wishlist) // 2]}
+
+
+async def main(count: int):
+    failures = []
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        ids = await seed(conn, count)
+        print(f'{count} rents, {count} users, {count} renters, {count * 5} images, {count * 3} rates seeded')
+        large = set((await conn.execute(text(
+            "SELECT relname FROM pg_class WHERE relkind = 'r' AND reltuples >= :rows"), {'rows': LARGE_TABLE_ROWS})).scalars())
+        for name, query in hot_queries(ids):
+            # bound parameters rather than literal_binds: the search query's regconfig has no literal form
+            compiled = query.compile(engine.sync_engine, compile_kwargs={'render_postcompile': True})
+            params = compiled.construct_params()
+            plan = (await conn.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + compiled.string,
+                                               tuple(params[name] for name in compiled.positiontup))).scalar()
+            plan = (json.loads(plan) if isinstance(plan, str) else plan)[0]['Plan']
+            scans = seq_scans(plan, large)
+            print(f'{"SEQ SCAN " + ", ".join(scans) if scans else "ok":30} {plan["Total Cost"]:>10.1f}  {name}')
+            if scans:
+                failures.append(name)
+        await trans.rollback()
+    await engine.dispose()
+    if failures:
+        print(f'{len(failures)} queries scan a large table: {", ".join(failures)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -0,0 +1,47 @@
+# Event-loop latency while concurrent logins check bcrypt hashes, inline (old handlers)
+# versus on the auth.hashing thread pool. No database needed.
+#
+#   python -m benchmarks.login_bench 20
+import asyncio
+import statistics
+import sys
+import time
+
+from auth.hashing import pwd_context, verify_password
+
+TICK = 0.005
+
+
+async def inline_verify(password: str, hashed: str):
+    return pwd_context.verify_and_update(password, hashed)
+
+
+async def measure(logins: int, verify) -> str:
+    hashed = pwd_context.hash('secret')
+    lags, done = [], asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append((time.perf_counter() - started - TICK) * 1000)
+
+    tick_task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK * 2)
+    started = time.perf_counter()
+    await asyncio.gather(*(verify('secret', hashed) for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await tick_task
+    lags.sort()
+    return (f'{logins} logins in {elapsed:.2f} s, loop lag p50 {statistics.median(lags):.1f} ms '
+            f'p99 {lags[int(len(lags) * 0.99) - 1]:.1f} ms max {lags[-1]:.1f} ms')
+
+
+async def main(logins: int):
+    print('inline:', await measure(logins, inline_verify))
+    print('pool:  ', await measure(logins, verify_password))
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20))
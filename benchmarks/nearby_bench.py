@@ -0,0 +1,60 @@
+# Times the /rent/nearby lookup on seeded rents around Tashkent: filling rent_distance
+# with the vectorized haversine, then a page of 10 plus the count.
+# Runs in a rolled-back transaction.
+#
+#   python -m benchmarks.nearby_bench 100000 3
+import asyncio
+import random
+import sys
+import time
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import engine
+from mobile.distances import refresh_rent_distances
+from models.models import Faculty, Jins, Rent, RentDistance, University
+
+CENTER = (41.3111, 69.2797)
+RUNS = 20
+
+
+async def main(count: int, radius_km: float):
+    rnd = random.Random(7)
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        session = AsyncSession(bind=conn)
+        jins_id = (await conn.execute(insert(Jins).values(name_uz='bench', name_ru='bench').returning(Jins.id))).scalar()
+        university_id = (await conn.execute(insert(University).values(
+            name_uz='bench', latitude=CENTER[0], longitude=CENTER[1]).returning(University.id))).scalar()
+        faculty_id = (await conn.execute(insert(Faculty).values(
+            name_uz='bench', university_id=university_id, latitude=CENTER[0], longitude=CENTER[1]).returning(Faculty.id))).scalar()
+        rows = [{'name': 'bench', 'student_jins_id': jins_id,
+                 'latitude': CENTER[0] + rnd.uniform(-0.15, 0.15),
+                 'longitude': CENTER[1] + rnd.uniform(-0.2, 0.2)} for _ in range(count)]
+        started = time.perf_counter()
+        for start in range(0, count, 5000):
+            res = await conn.execute(insert(Rent).returning(Rent.id, Rent.latitude, Rent.longitude, Rent.student_jins_id), rows[start:start + 5000])
+            await refresh_rent_distances(session, res.all())
+        print(f'insert + distance fill for {count} rents: {time.perf_counter() - started:.1f} s')
+        await conn.execute(text('ANALYZE rent'))
+        await conn.execute(text('ANALYZE rent_distance'))
+
+        query = select(RentDistance.rent_id, RentDistance.distance).where(
+            RentDistance.faculty_id == faculty_id,
+            RentDistance.student_jins_id == jins_id,
+            RentDistance.distance <= radius_km)
+        page = query.order_by(RentDistance.distance, RentDistance.rent_id).limit(10)
+        total = select(func.count()).select_from(query.subquery())
+        started = time.perf_counter()
+        for _ in range(RUNS):
+            await conn.execute(page)
+            found = (await conn.execute(total)).scalar()
+        print(f'radius {radius_km} km: {found} rents inside, page + count {(time.perf_counter() - started) / RUNS * 1000:.2f} ms')
+        await trans.rollback()
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000,
+                     float(sys.argv[2]) if len(sys.argv) > 2 else 3.0))
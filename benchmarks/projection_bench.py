@@ -0,0 +1,83 @@
+# Compares the ORM + selectinload rent page with the single-statement projection:
+# statements sent per page and mean time per page, including building the pydantic items.
+# Runs in a rolled-back transaction.
+#
+#   python -m benchmarks.projection_bench 20000 50
+import asyncio
+import random
+import sys
+import time
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from database import engine
+from mobile.projection import rent_items, rent_projection
+from mobile.scheme import RentGETScheme
+from models.models import Category, Image, Jins, Rent, Renter
+
+RUNS = 50
+IMAGES_PER_RENT = 5
+
+
+async def main(count: int, size: int):
+    rnd = random.Random(3)
+    statements = 0
+
+    def count_statement(*args):
+        nonlocal statements
+        statements += 1
+
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        session = AsyncSession(bind=conn)
+        jins_id = (await conn.execute(insert(Jins).values(name_uz='bench', name_ru='bench').returning(Jins.id))).scalar()
+        category_id = (await conn.execute(insert(Category).values(name_uz='bench', name_ru='bench').returning(Category.id))).scalar()
+        renter_id = (await conn.execute(insert(Renter).values(
+            firstname='bench', lastname='bench', phone='bench', image='bench', password='$2b$12$' + 'x' * 53).returning(Renter.id))).scalar()
+        rows = [{'name': f'bench {i}', 'description': 'bench ' * 40, 'category_id': category_id, 'room_count': 2,
+                 'total_price': rnd.randint(100, 900), 'student_jins_id': jins_id, 'student_count': 2,
+                 'renter_id': renter_id, 'location': 'Toshkent', 'latitude': 41.3, 'longitude': 69.2,
+                 'wifi': True, 'conditioner': False, 'washing_machine': True, 'TV': False, 'refrigerator': True,
+                 'furniture': True, 'other_convenience': ''} for i in range(count)]
+        for start in range(0, count, 5000):
+            ids = (await conn.execute(insert(Rent).returning(Rent.id), rows[start:start + 5000])).scalars().all()
+            await conn.execute(insert(Image), [{'rent_id': rent_id, 'url': f'images/{rent_id}-{k}.jpg',
+                                                'hashcode': f'{rent_id}-{k}'} for rent_id in ids for k in range(IMAGES_PER_RENT)])
+
+        orm = select(Rent).options(
+            selectinload(Rent.jins), selectinload(Rent.category),
+            selectinload(Rent.renter), selectinload(Rent.image)
+        ).where(Rent.student_jins_id == jins_id).order_by(Rent.created_at.desc(), Rent.id.desc())
+        projected = rent_projection().where(Rent.student_jins_id == jins_id).order_by(
+            Rent.created_at.desc(), Rent.id.desc())
+
+        async def orm_page(offset):
+            rents = (await session.execute(orm.offset(offset).limit(size))).scalars().all()
+            items = [RentGETScheme.model_validate(rent, from_attributes=True) for rent in rents]
+            session.expunge_all()
+            return items
+
+        async def projected_page(offset):
+            rows = (await session.execute(projected.offset(offset).limit(size))).all()
+            return [RentGETScheme.model_validate(item) for item in rent_items(rows)]
+
+        event.listen(engine.sync_engine, 'before_cursor_execute', count_statement)
+        print(f'{count} rents with {IMAGES_PER_RENT} images each, page of {size}, mean of {RUNS} runs')
+        for number in (1, 20):
+            for label, page in (('orm + selectinload', orm_page), ('projection', projected_page)):
+                statements = 0
+                started = time.perf_counter()
+                for _ in range(RUNS):
+                    items = await page((number - 1) * size)
+                elapsed = (time.perf_counter() - started) / RUNS * 1000
+                print(f'page {number:2} {label:20} {statements / RUNS:.0f} statements  {elapsed:7.2f} ms  ({len(items)} items)')
+        event.remove(engine.sync_engine, 'before_cursor_execute', count_statement)
+        await trans.rollback()
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else 50))
@@ -0,0 +1,75 @@
+# Compares the old ilike search with the tsvector/trigram search on a seeded rent table.
+# Everything runs in one transaction that is rolled back, so it is safe on a dev database.
+#
+#   python -m benchmarks.search_bench 50000
+import asyncio
+import random
+import sys
+import time
+
+from sqlalchemy import and_, func, insert, or_, select, text
+
+from database import engine
+from mobile.search import filter_search, rank_search
+from models.models import Jins, Rent
+
+WORDS = ['kvartira', 'uy', 'xona', 'Chilonzor', 'Yunusobod', "Oʻzbekiston", 'metro', 'talaba', 'yotoqxona',
+         'квартира', 'комната', 'уютная', 'рядом', 'метро', 'центр', 'студентов', 'ремонт', 'мебель']
+QUERIES = ['metro', 'kvartira chilonzor', 'квартиры', 'yunusobod', 'kvartra']
+RUNS = 20
+
+
+def seed_rows(count: int, jins_id: int):
+    rnd = random.Random(42)
+    syllables = ['ka', 'zo', 'ri', 'mu', 'te', 'lo', 'bi', 'sha', 'dor', 'xon', 'qu', 'vel']
+    # a long tail of filler words so the query terms are selective, like in real listings
+    filler = [''.join(rnd.choice(syllables) for _ in range(3)) for _ in range(5000)]
+
+    def word():
+        return rnd.choice(WORDS) if rnd.random() < 0.02 else rnd.choice(filler)
+
+    for _ in range(count):
+        yield {
+            'name': ' '.join(word() for _ in range(3)),
+            'description': ' '.join(word() for _ in range(40)),
+            'location': word(),
+            'student_jins_id': jins_id,
+            'total_price': rnd.randint(100, 900),
+        }
+
+
+async def timed(conn, query) -> float:
+    started = time.perf_counter()
+    for _ in range(RUNS):
+        await conn.execute(query)
+    return (time.perf_counter() - started) / RUNS * 1000
+
+
+async def main(count: int):
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        jins_id = (await conn.execute(insert(Jins).values(name_uz='bench', name_ru='bench').returning(Jins.id))).scalar()
+        rows = list(seed_rows(count, jins_id))
+        for start in range(0, count, 5000):
+            await conn.execute(insert(Rent), rows[start:start + 5000])
+        await conn.execute(text('ANALYZE rent'))
+
+        print(f'{count} rents, mean of {RUNS} runs, page of 10 + count')
+        for q in QUERIES:
+            pattern = f'%{q}%'
+            ilike = select(Rent.id).where(and_(
+                Rent.student_jins_id == jins_id,
+                or_(Rent.name.ilike(pattern), Rent.description.ilike(pattern))))
+            ilike_count = select(func.count()).select_from(ilike.subquery())
+            ranked = filter_search(select(Rent.id).where(Rent.student_jins_id == jins_id), q)
+            ranked_count = select(func.count()).select_from(ranked.subquery())
+
+            old = await timed(conn, ilike.order_by(Rent.id.desc()).limit(10)) + await timed(conn, ilike_count)
+            new = await timed(conn, rank_search(ranked, q).limit(10)) + await timed(conn, ranked_count)
+            print(f'{q!r:24} ilike {old:8.2f} ms   search {new:8.2f} ms')
+        await trans.rollback()
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -0,0 +1,61 @@
+# Serializes one 100-item Page[RentGETScheme] the ways a handler can:
+#   fastapi default   response_model validation + serialize + JSONResponse (stdlib json)
+#   orjson response   the same validation + serialize, rendered by ORJSONResponse
+#   model_dump_json   responses.model_response, straight from pydantic-core
+# No database needed.
+#
+#   python -m benchmarks.serialize_bench 100
+import asyncio
+import sys
+import time
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from fastapi_pagination import Page
+
+from mobile.scheme import RentGETScheme
+from responses import model_response
+
+RUNS = 2000
+
+
+def rent(i: int) -> dict:
+    return {
+        'id': i, 'name': f'Kvartira {i} Chilonzor', 'description': 'Уютная квартира рядом с метро, ' * 6,
+        'category': {'id': 1, 'name_uz': 'Kvartira', 'name_ru': 'Квартира'}, 'room_count': 2,
+        'total_price': 350.5 + i, 'jins': {'id': 1, 'name_uz': 'Erkak', 'name_ru': 'Мужской'},
+        'image': [{'id': i * 10 + k, 'url': f'images/ab/cd/{i:064x}.jpg', 'hashcode': f'{i:064x}'} for k in range(5)],
+        'student_count': 3, 'renter': {'id': 7, 'firstname': 'Ali', 'lastname': 'Valiyev', 'phone': '+998901234567',
+                                       'image': f'{7:064x}'},
+        'location': 'Toshkent, Chilonzor 9', 'latitude': 41.2856, 'longitude': 69.2034, 'wifi': True,
+        'conditioner': False, 'washing_machine': True, 'TV': True, 'refrigerator': True, 'furniture': True,
+        'other_convenience': 'parking',
+    }
+
+
+async def main(size: int):
+    page = Page[RentGETScheme](items=[rent(i) for i in range(size)], total=5000, page=1, size=size, pages=5000 // size)
+    field = create_response_field(name='response', type_=Page[RentGETScheme])
+
+    async def fastapi_default():
+        return JSONResponse(await serialize_response(field=field, response_content=page)).body
+
+    async def orjson_response():
+        return ORJSONResponse(await serialize_response(field=field, response_content=page)).body
+
+    async def dump_json():
+        return model_response(page).body
+
+    print(f'Page[RentGETScheme] with {size} items, mean of {RUNS} runs')
+    for label, render in (('fastapi default', fastapi_default), ('orjson response', orjson_response),
+                          ('model_dump_json', dump_json)):
+        body = await render()
+        started = time.perf_counter()
+        for _ in range(RUNS):
+            await render()
+        print(f'{label:16} {(time.perf_counter() - started) / RUNS * 1000:6.3f} ms  {len(body)} bytes')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100))
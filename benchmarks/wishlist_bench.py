@@ -0,0 +1,100 @@
+# Compares the old /get-wishlist query (every saved row with the full rent through selectinload)
+# with the keyset card page: statements and mean time per call for the first and a deep page.
+# The user's saves are spread among everyone else's, as they are on a live table.
+# Runs in a rolled-back transaction.
+#
+#   python -m benchmarks.wishlist_bench 500 20
+import asyncio
+import random
+import sys
+import time
+
+from sqlalchemy import event, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+
+from database import engine
+from mobile.wishlist import fetch_wishlist_page
+from models.models import Category, Faculty, Image, Jins, Rent, RentDistance, Renter, University, User, Wishlist
+
+RUNS = 50
+RENTS = 20000
+OTHER_USERS = 2000
+IMAGES_PER_RENT = 5
+
+
+async def main(saved: int, size: int):
+    rnd = random.Random(7)
+    statements = 0
+
+    def count_statement(*args):
+        nonlocal statements
+        statements += 1
+
+    async with engine.connect() as conn:
+        trans = await conn.begin()
+        session = AsyncSession(bind=conn)
+        jins_id = (await conn.execute(insert(Jins).values(name_uz='bench').returning(Jins.id))).scalar()
+        category_id = (await conn.execute(insert(Category).values(name_uz='bench').returning(Category.id))).scalar()
+        renter_id = (await conn.execute(insert(Renter).values(
+            firstname='bench', phone='bench', password='x').returning(Renter.id))).scalar()
+        university_id = (await conn.execute(insert(University).values(
+            name_uz='bench', latitude=41.3, longitude=69.28).returning(University.id))).scalar()
+        faculty_id = (await conn.execute(insert(Faculty).values(
+            name_uz='bench', university_id=university_id, latitude=41.3, longitude=69.28).returning(Faculty.id))).scalar()
+        users = (await conn.execute(insert(User).returning(User.id), [
+            {'firstname': 'bench', 'phone': f'+99892{i:07}', 'jins_id': jins_id, 'faculty_id': faculty_id,
+             'password': 'x'} for i in range(OTHER_USERS + 1)])).scalars().all()
+        rents = []
+        for start in range(0, RENTS, 5000):
+            ids = (await conn.execute(insert(Rent).returning(Rent.id), [
+                {'name': f'bench {i}', 'description': 'bench ' * 40, 'category_id': category_id, 'room_count': 2,
+                 'total_price': rnd.randint(100, 900), 'student_jins_id': jins_id, 'student_count': 2,
+                 'renter_id': renter_id, 'location': 'Toshkent', 'latitude': 41.3, 'longitude': 69.28}
+                for i in range(start, min(start + 5000, RENTS))])).scalars().all()
+            await conn.execute(insert(Image), [{'rent_id': rent_id, 'url': f'images/{rent_id}-{k}.jpg',
+                                                'hashcode': f'{rent_id}-{k}'} for rent_id in ids for k in range(IMAGES_PER_RENT)])
+            await conn.execute(insert(RentDistance), [{'rent_id': rent_id, 'faculty_id': faculty_id,
+                                                       'student_jins_id': jins_id, 'distance': rnd.uniform(0, 15)}
+                                                      for rent_id in ids])
+            rents += ids
+        user_id = users[0]
+        pairs = {(rnd.choice(users[1:]), rnd.choice(rents)) for _ in range(OTHER_USERS * 50)}
+        pairs |= {(user_id, rent_id) for rent_id in rnd.sample(rents, saved)}
+        pairs = list(pairs)
+        rnd.shuffle(pairs)
+        await conn.execute(insert(Wishlist), [{'user_id': user_id, 'rent_id': rent_id} for user_id, rent_id in pairs])
+        await conn.execute(text('ANALYZE'))
+
+        async def full_list():
+            result = await session.execute(
+                select(Wishlist).options(selectinload(Wishlist.rent)).where(Wishlist.user_id == user_id))
+            rows = result.scalars().all()
+            session.expunge_all()
+            return rows
+
+        deep_cursor = None
+        for _ in range(10):
+            deep_cursor = (await fetch_wishlist_page(session, user_id, deep_cursor, size))['next_cursor']
+
+        event.listen(engine.sync_engine, 'before_cursor_execute', count_statement)
+        print(f'{saved} saved among {len(pairs)} wishlist rows, page of {size}, mean of {RUNS} runs')
+        for label, call in (
+            ('old: all rows + selectinload', full_list),
+            ('page 1', lambda: fetch_wishlist_page(session, user_id, None, size)),
+            ('page 11', lambda: fetch_wishlist_page(session, user_id, deep_cursor, size)),
+        ):
+            statements = 0
+            started = time.perf_counter()
+            for _ in range(RUNS):
+                await call()
+            elapsed = (time.perf_counter() - started) / RUNS * 1000
+            print(f'{label:30} {statements / RUNS:.0f} statements  {elapsed:7.2f} ms')
+        event.remove(engine.sync_engine, 'before_cursor_execute', count_statement)
+        await trans.rollback()
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+                     int(sys.argv[2]) if len(sys.argv) > 2 else 20))
@@ -9,6 +9,41 @@ DB_HOST = os.getenv('DB_HOST')
 DB_USER = os.getenv('DB_USER')
 SECRET = os.environ.get('SECRET')
 
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', '1') == '1'
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 100))
+
+# read-only GET handlers go to the replica when one is set, the primary otherwise
+DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST')
+DB_REPLICA_PORT = os.getenv('DB_REPLICA_PORT', DB_PORT)
+DB_REPLICA_CONNECT_TIMEOUT = float(os.getenv('DB_REPLICA_CONNECT_TIMEOUT', 2))
+DB_REPLICA_MAX_LAG = float(os.getenv('DB_REPLICA_MAX_LAG', 5))
+DB_REPLICA_CHECK_SECONDS = int(os.getenv('DB_REPLICA_CHECK_SECONDS', 5))
+
+REFERENCE_CACHE_TTL = int(os.getenv('REFERENCE_CACHE_TTL', 3600))
+FEED_CACHE_SIZE = int(os.getenv('FEED_CACHE_SIZE', 2000))
+FEED_CACHE_TTL = int(os.getenv('FEED_CACHE_TTL', 60))
+
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 2))
+
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+ACCESS_TOKEN_MINUTES = int(os.getenv('ACCESS_TOKEN_MINUTES', 30))
+REFRESH_TOKEN_DAYS = int(os.getenv('REFRESH_TOKEN_DAYS', 30))
+REVOCATION_REFRESH_SECONDS = int(os.getenv('REVOCATION_REFRESH_SECONDS', 5))
+
+IMAGE_DIR = os.getenv('IMAGE_DIR', 'images')
+MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 10 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 64 * 1024))
+MAX_IMAGES_PER_UPLOAD = int(os.getenv('MAX_IMAGES_PER_UPLOAD', 20))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+# how long a source Pillow could not render is served as the original without trying again
+FAILED_RENDER_TTL = int(os.getenv('FAILED_RENDER_TTL', 3600))
+IMAGE_PATH_CACHE_SIZE = int(os.getenv('IMAGE_PATH_CACHE_SIZE', 50000))
+
 
 
 
@@ -1,16 +1,207 @@
+import asyncio
+import time
+
+import asyncpg
+from sqlalchemy import Select, event, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from typing import AsyncGenerator
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from config import DB_NAME, DB_USER, DB_PASSWORD,  DB_HOST, DB_PORT
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.util.queue import AsyncAdaptedQueue, Empty
+from config import DB_NAME, DB_USER, DB_PASSWORD,  DB_HOST, DB_PORT, DB_POOL_SIZE, DB_MAX_OVERFLOW, \
+    DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING, DB_STATEMENT_CACHE_SIZE, DB_REPLICA_HOST, DB_REPLICA_PORT, \
+    DB_REPLICA_CONNECT_TIMEOUT, DB_REPLICA_MAX_LAG, DB_REPLICA_CHECK_SECONDS
+
+
+class PoolMetrics:
+    def __init__(self):
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.timeouts = 0
+        self.overflows = 0
+
+    def record_wait(self, seconds: float):
+        self.waits += 1
+        self.wait_seconds += seconds
+        self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+
+    def stats(self) -> dict:
+        return {
+            'waits': self.waits, 'timeouts': self.timeouts, 'overflows': self.overflows,
+            'wait_ms_total': round(self.wait_seconds * 1000, 3),
+            'wait_ms_avg': round(self.wait_seconds * 1000 / self.waits, 3) if self.waits else 0.0,
+            'wait_ms_max': round(self.max_wait_seconds * 1000, 3),
+        }
+
+
+class TimedQueue(AsyncAdaptedQueue):
+    metrics = None
+
+    def get(self, block: bool = True, timeout: float = None):
+        if not block:
+            return super().get(block, timeout)
+        # at max overflow the pool always asks with block=True, taking an idle connection is no wait.
+        # empty() is not enough: the blocking get yields before it dequeues, so others would see it too
+        try:
+            return self.get_nowait()
+        except Empty:
+            pass
+        started = time.perf_counter()
+        try:
+            return super().get(block, timeout)
+        except Empty:
+            self.metrics.timeouts += 1
+            raise
+        finally:
+            self.metrics.record_wait(time.perf_counter() - started)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that counts checkout waits, timeouts and overflow connections."""
+    _queue_class = TimedQueue
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.metrics = self._pool.metrics = PoolMetrics()
+
+    def _inc_overflow(self) -> bool:
+        opened = super()._inc_overflow()
+        if opened and self._overflow > 0:
+            self.metrics.overflows += 1
+        return opened
+
+    def recreate(self):
+        # dispose() swaps the pool, the counters carry over
+        pool = super().recreate()
+        pool.metrics = pool._pool.metrics = self.metrics
+        return pool
+
+    def stats(self) -> dict:
+        return {
+            'pool_size': self.size(), 'max_overflow': self._max_overflow, 'timeout': self._timeout,
+            'checked_out': self.checkedout(), 'checked_in': self.checkedin(), 'overflow': max(self.overflow(), 0),
+            **self.metrics.stats(),
+        }
+
+
+def _create_engine(url: str, **connect_args):
+    return create_async_engine(
+        url,
+        poolclass=InstrumentedPool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={'prepared_statement_cache_size': DB_STATEMENT_CACHE_SIZE, **connect_args},
+    )
+
 
 DB_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-engine = create_async_engine(DB_URL)
+engine = _create_engine(DB_URL)
 async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=True)
 Base = declarative_base()
 
 
+async def _connect_replica(*args, **kwargs):
+    try:
+        return await asyncpg.connect(*args, **kwargs)
+    except Exception as e:
+        # refused or timed out connects never reach handle_error
+        replica.mark_down(e)
+        raise
+
+
+replica_engine = None
+if DB_REPLICA_HOST:
+    REPLICA_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_REPLICA_HOST}:{DB_REPLICA_PORT}/{DB_NAME}"
+    replica_engine = _create_engine(REPLICA_URL, timeout=DB_REPLICA_CONNECT_TIMEOUT, async_creator_fn=_connect_replica)
+
+# an idle replica has nothing to replay, so the last replay timestamp only counts while WAL is pending
+REPLICA_LAG = text(
+    "SELECT CASE WHEN pg_is_in_recovery() AND pg_last_wal_receive_lsn() IS DISTINCT FROM pg_last_wal_replay_lsn() "
+    "THEN extract(epoch FROM now() - pg_last_xact_replay_timestamp()) ELSE 0 END"
+)
+
+
+class ReplicaHealth:
+    """Whether reads may go to the replica: polled in the background, dropped at once on a connection error."""
+
+    def __init__(self, bind):
+        self.engine = bind
+        self.healthy = False
+        self.lag = None
+        self.checked_at = None
+
+    def mark_down(self, reason):
+        if self.healthy:
+            print(f'Replica marked down: {reason}')
+        self.healthy = False
+
+    async def check(self):
+        async with self.engine.connect() as conn:
+            self.lag = float((await conn.execute(REPLICA_LAG)).scalar() or 0)
+        self.checked_at = time.time()
+        if self.lag > DB_REPLICA_MAX_LAG:
+            self.mark_down(f'{self.lag:.1f}s behind')
+        else:
+            self.healthy = True
+
+    async def run(self):
+        while True:
+            try:
+                await self.check()
+            except Exception as e:
+                self.mark_down(e)
+            await asyncio.sleep(DB_REPLICA_CHECK_SECONDS)
+
+    def stats(self):
+        if self.engine is None:
+            return None
+        return {'healthy': self.healthy, 'lag_seconds': self.lag, 'checked_at': self.checked_at,
+                **self.engine.pool.stats()}
+
+
+replica = ReplicaHealth(replica_engine)
+
+if replica_engine is not None:
+    @event.listens_for(replica_engine.sync_engine, 'handle_error')
+    def _replica_error(context):
+        if context.is_disconnect or isinstance(context.original_exception, (OSError, asyncio.TimeoutError)):
+            replica.mark_down(context.original_exception)
+
+
+class ReadRoutingSession(Session):
+    """Sends plain SELECTs to the replica while it is healthy.
+
+    Anything else (DML, flushes, text(), SELECT ... FOR UPDATE) goes to the primary and pins the
+    session there, so a handler reads its own writes for the rest of the request.
+    """
+    pinned = False
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if not self.pinned and replica.healthy and isinstance(clause, Select) and clause._for_update_arg is None:
+            return replica_engine.sync_engine
+        self.pinned = True
+        return engine.sync_engine
+
+
+read_session_maker = sessionmaker(engine, class_=AsyncSession, sync_session_class=ReadRoutingSession,
+                                  expire_on_commit=True)
+
+
+def read_from_primary(session: AsyncSession):
+    """Pins a read session to the primary for the rest of the request."""
+    session.sync_session.pinned = True
+
+
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
 
+
+async def get_read_session() -> AsyncGenerator[AsyncSession, None]:
+    async with read_session_maker() as session:
+        yield session
@@ -1,12 +1,18 @@
+import asyncio
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 
 from mobile.mobile import mobile_router
 
 from auth.auth import auth_router
+from auth.reference import reference_cache
+from auth.revocation import revocation_list
+from database import async_session_maker, replica
 from models.models import User
 from renter.renter import renter_router
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 app.include_router(mobile_router)
 
 
@@ -14,3 +20,21 @@ app.include_router(mobile_router, prefix='/student')
 app.include_router(auth_router, prefix='/auth')
 app.include_router(renter_router, prefix='/renter')
 
+
+@app.on_event('startup')
+async def warm_reference_cache():
+    async with async_session_maker() as session:
+        await reference_cache.ensure(session)
+
+
+@app.on_event('startup')
+async def start_revocation_list():
+    async with async_session_maker() as session:
+        await revocation_list.refresh(session)
+    app.state.revocation_task = asyncio.create_task(revocation_list.run())
+
+
+@app.on_event('startup')
+async def start_replica_health():
+    if replica.engine is not None:
+        app.state.replica_task = asyncio.create_task(replica.run())
@@ -0,0 +1,33 @@
+"""rating totals on rent
+
+Revision ID: 088957c09b8d
+Revises: 582fb23c58ce
+Create Date: 2026-10-18 22:58:09.114327
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '088957c09b8d'
+down_revision: Union[str, None] = '582fb23c58ce'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('rent', sa.Column('rating_sum', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('rent', sa.Column('rating_count', sa.Integer(), nullable=False, server_default='0'))
+    op.execute(
+        'UPDATE rent SET rating_sum = t.rating_sum, rating_count = t.rating_count '
+        'FROM (SELECT rent_id, coalesce(sum(rate), 0) AS rating_sum, count(*) AS rating_count FROM rate GROUP BY rent_id) t '
+        'WHERE rent.id = t.rent_id'
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('rent', 'rating_count')
+    op.drop_column('rent', 'rating_sum')
@@ -0,0 +1,41 @@
+"""content-addressed image store
+
+Revision ID: 255aff3adfbe
+Revises: fc26d393a22c
+Create Date: 2026-10-18 16:27:33.905126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '255aff3adfbe'
+down_revision: Union[str, None] = 'fc26d393a22c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'stored_file',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(), nullable=True),
+        sa.Column('path', sa.String(), nullable=True),
+        sa.Column('size', sa.Integer(), nullable=True),
+        sa.Column('content_type', sa.String(), nullable=True),
+        sa.Column('refcount', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sha256'),
+    )
+    # the same photo on several rents now shares one hashcode
+    op.drop_constraint('image_hashcode_key', 'image', type_='unique')
+    op.create_index('ix_image_hashcode', 'image', ['hashcode'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_image_hashcode', table_name='image')
+    op.create_unique_constraint('image_hashcode_key', 'image', ['hashcode'])
+    op.drop_table('stored_file')
@@ -0,0 +1,41 @@
+"""rent full-text and trigram search
+
+Revision ID: 2dfe34817153
+Revises:
+Create Date: 2026-10-18 09:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '2dfe34817153'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RENT_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', translate(coalesce(name, ''), '''ʻʼ‘’`', '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', translate(coalesce(location, ''), '''ʻʼ‘’`', '')), 'B') || "
+    "setweight(to_tsvector('simple', translate(coalesce(description, ''), '''ʻʼ‘’`', '')), 'C') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'C')"
+)
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.add_column('rent', sa.Column('search_vector', postgresql.TSVECTOR(),
+                                    sa.Computed(RENT_SEARCH_VECTOR, persisted=True)))
+    op.create_index('ix_rent_search_vector', 'rent', ['search_vector'], postgresql_using='gin')
+    op.create_index('ix_rent_name_trgm', 'rent', ['name'], postgresql_using='gin',
+                    postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_rent_name_trgm', table_name='rent')
+    op.drop_index('ix_rent_search_vector', table_name='rent')
+    op.drop_column('rent', 'search_vector')
@@ -0,0 +1,27 @@
+"""rent location index for nearby search
+
+Revision ID: 38b5cfc0fac2
+Revises: 2dfe34817153
+Create Date: 2026-10-18 11:40:07.118952
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '38b5cfc0fac2'
+down_revision: Union[str, None] = '2dfe34817153'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_rent_jins_lat_lon', 'rent', ['student_jins_id', 'latitude', 'longitude'],
+                    postgresql_include=['id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_rent_jins_lat_lon', table_name='rent')
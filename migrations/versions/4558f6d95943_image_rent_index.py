@@ -0,0 +1,25 @@
+"""image rent_id index for the rent projection
+
+Revision ID: 4558f6d95943
+Revises: 255aff3adfbe
+Create Date: 2026-10-18 21:02:16.377045
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4558f6d95943'
+down_revision: Union[str, None] = '255aff3adfbe'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_image_rent_id', 'image', ['rent_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_image_rent_id', table_name='image')
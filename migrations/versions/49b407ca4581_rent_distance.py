@@ -0,0 +1,46 @@
+"""precomputed rent to university/faculty distances
+
+Revision ID: 49b407ca4581
+Revises: 38b5cfc0fac2
+Create Date: 2026-10-18 13:05:52.640371
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '49b407ca4581'
+down_revision: Union[str, None] = '38b5cfc0fac2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'rent_distance',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('rent_id', sa.Integer(), nullable=True),
+        sa.Column('university_id', sa.Integer(), nullable=True),
+        sa.Column('faculty_id', sa.Integer(), nullable=True),
+        sa.Column('student_jins_id', sa.Integer(), nullable=True),
+        sa.Column('distance', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['rent_id'], ['rent.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['university_id'], ['university.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['faculty_id'], ['faculty.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_rent_distance_rent_id', 'rent_distance', ['rent_id'])
+    op.create_index('ix_rent_distance_faculty', 'rent_distance', ['faculty_id', 'student_jins_id', 'distance'],
+                    postgresql_include=['rent_id'])
+    op.create_index('ix_rent_distance_university', 'rent_distance', ['university_id', 'student_jins_id', 'distance'],
+                    postgresql_include=['rent_id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_rent_distance_university', table_name='rent_distance')
+    op.drop_index('ix_rent_distance_faculty', table_name='rent_distance')
+    op.drop_index('ix_rent_distance_rent_id', table_name='rent_distance')
+    op.drop_table('rent_distance')
@@ -0,0 +1,48 @@
+"""indexes and constraints for the hot query paths
+
+Revision ID: 582fb23c58ce
+Revises: 4558f6d95943
+Create Date: 2026-10-18 22:14:41.508213
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '582fb23c58ce'
+down_revision: Union[str, None] = '4558f6d95943'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # login and reset-password already expect one user per phone (scalar_one_or_none);
+    # duplicates have to be merged by hand before this runs
+    op.create_unique_constraint('user_phone_key', 'user', ['phone'])
+
+    op.create_index('ix_rent_jins_created', 'rent', ['student_jins_id', 'created_at', 'id'])
+    op.create_index('ix_rent_jins_price', 'rent', ['student_jins_id', 'total_price', 'id'])
+    op.create_index('ix_rent_renter_id', 'rent', ['renter_id'])
+    op.create_index('ix_rate_rent_id', 'rate', ['rent_id'])
+    op.create_index('ix_faculty_university_id', 'faculty', ['university_id'])
+    op.create_index('ix_district_region_id', 'district', ['region_id'])
+
+    # a toggle race could have saved the same rent twice, keep the oldest row
+    op.execute(
+        'DELETE FROM wishlist a USING wishlist b '
+        'WHERE a.user_id = b.user_id AND a.rent_id = b.rent_id AND a.id > b.id'
+    )
+    op.create_unique_constraint('uq_wishlist_user_rent', 'wishlist', ['user_id', 'rent_id'])
+
+
+def downgrade() -> None:
+    op.drop_constraint('uq_wishlist_user_rent', 'wishlist', type_='unique')
+    op.drop_index('ix_district_region_id', table_name='district')
+    op.drop_index('ix_faculty_university_id', table_name='faculty')
+    op.drop_index('ix_rate_rent_id', table_name='rate')
+    op.drop_index('ix_rent_renter_id', table_name='rent')
+    op.drop_index('ix_rent_jins_price', table_name='rent')
+    op.drop_index('ix_rent_jins_created', table_name='rent')
+    op.drop_constraint('user_phone_key', 'user', type_='unique')
@@ -0,0 +1,26 @@
+"""wishlist keyset index
+
+Revision ID: 75a9adf8ebbd
+Revises: 8703a1f4166b
+Create Date: 2026-10-19 00:37:05.318846
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '75a9adf8ebbd'
+down_revision: Union[str, None] = '8703a1f4166b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # /get-wishlist pages a user's rows newest first, seeking on the id
+    op.create_index('ix_wishlist_user_id', 'wishlist', ['user_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_wishlist_user_id', table_name='wishlist')
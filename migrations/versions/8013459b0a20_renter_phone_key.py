@@ -0,0 +1,35 @@
+"""unique renter phone
+
+Revision ID: 8013459b0a20
+Revises: bb7370abdbca
+Create Date: 2026-10-19 01:48:16.730952
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8013459b0a20'
+down_revision: Union[str, None] = 'bb7370abdbca'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Renter.phone was always declared unique, so a database created from the models already has
+    # the constraint; older ones do not. Renter login, reset-password and /phone_number look it up,
+    # and login expects one row (scalar_one_or_none): duplicates have to be merged by hand first
+    op.execute(
+        "DO $$ BEGIN "
+        "IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'renter_phone_key') THEN "
+        "ALTER TABLE renter ADD CONSTRAINT renter_phone_key UNIQUE (phone); "
+        "END IF; "
+        "END $$"
+    )
+
+
+def downgrade() -> None:
+    # the constraint may predate this revision, it stays
+    pass
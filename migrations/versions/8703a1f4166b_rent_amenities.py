@@ -0,0 +1,34 @@
+"""rent amenity bitmask
+
+Revision ID: 8703a1f4166b
+Revises: 088957c09b8d
+Create Date: 2026-10-18 23:41:52.660184
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8703a1f4166b'
+down_revision: Union[str, None] = '088957c09b8d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+RENT_AMENITY_BITS = (
+    '(CASE WHEN "wifi" THEN 1 ELSE 0 END) | (CASE WHEN "conditioner" THEN 2 ELSE 0 END) | '
+    '(CASE WHEN "washing_machine" THEN 4 ELSE 0 END) | (CASE WHEN "TV" THEN 8 ELSE 0 END) | '
+    '(CASE WHEN "refrigerator" THEN 16 ELSE 0 END) | (CASE WHEN "furniture" THEN 32 ELSE 0 END)'
+)
+
+
+def upgrade() -> None:
+    op.add_column('rent', sa.Column('amenities', sa.Integer(), sa.Computed(RENT_AMENITY_BITS, persisted=True)))
+    op.create_index('ix_rent_jins_amenities', 'rent', ['student_jins_id', 'amenities'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_rent_jins_amenities', table_name='rent')
+    op.drop_column('rent', 'amenities')
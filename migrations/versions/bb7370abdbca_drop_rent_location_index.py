@@ -0,0 +1,27 @@
+"""drop the rent location index
+
+Revision ID: bb7370abdbca
+Revises: 75a9adf8ebbd
+Create Date: 2026-10-19 01:12:48.204517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bb7370abdbca'
+down_revision: Union[str, None] = '75a9adf8ebbd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # /rent/nearby reads the precomputed rent_distance rows, nothing does a bounding box on rent any more
+    op.drop_index('ix_rent_jins_lat_lon', table_name='rent')
+
+
+def downgrade() -> None:
+    op.create_index('ix_rent_jins_lat_lon', 'rent', ['student_jins_id', 'latitude', 'longitude'],
+                    postgresql_include=['id'])
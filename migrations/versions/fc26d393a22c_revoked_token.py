@@ -0,0 +1,39 @@
+"""revoked tokens and subjects
+
+Revision ID: fc26d393a22c
+Revises: 49b407ca4581
+Create Date: 2026-10-18 15:41:07.218934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'fc26d393a22c'
+down_revision: Union[str, None] = '49b407ca4581'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'revoked_token',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('jti', sa.String(), nullable=True),
+        sa.Column('revoked_at', sa.TIMESTAMP(), nullable=True),
+        sa.Column('expires_at', sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_revoked_token_jti', 'revoked_token', ['jti'], unique=True)
+    op.create_index('ix_revoked_token_revoked_at', 'revoked_token', ['revoked_at'])
+    op.create_index('ix_revoked_token_expires_at', 'revoked_token', ['expires_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_revoked_token_expires_at', table_name='revoked_token')
+    op.drop_index('ix_revoked_token_revoked_at', table_name='revoked_token')
+    op.drop_index('ix_revoked_token_jti', table_name='revoked_token')
+    op.drop_table('revoked_token')
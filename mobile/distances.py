@@ -0,0 +1,40 @@
+import numpy as np
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from mobile.geo import distance_matrix
+from models.models import Faculty, RentDistance, University
+
+# pairs further apart than this are not stored, nobody commutes across the country
+MAX_DISTANCE_KM = 30
+
+
+async def _targets(session: AsyncSession, model):
+    result = await session.execute(
+        select(model.id, model.latitude, model.longitude).where(
+            model.latitude.is_not(None), model.longitude.is_not(None)))
+    return result.all()
+
+
+def _pairs(rents, targets, column: str):
+    if not rents or not targets:
+        return []
+    matrix = distance_matrix([r[1] for r in rents], [r[2] for r in rents],
+                             [t[1] for t in targets], [t[2] for t in targets])
+    rent_idx, target_idx = np.nonzero(matrix <= MAX_DISTANCE_KM)
+    return [
+        {'rent_id': rents[i][0], 'student_jins_id': rents[i][3], 'university_id': None, 'faculty_id': None,
+         column: targets[j][0], 'distance': float(matrix[i, j])}
+        for i, j in zip(rent_idx.tolist(), target_idx.tolist())
+    ]
+
+
+async def refresh_rent_distances(session: AsyncSession, rents) -> int:
+    """Rewrites the distance rows for (id, latitude, longitude, student_jins_id) rents, caller commits."""
+    await session.execute(delete(RentDistance).where(RentDistance.rent_id.in_([r[0] for r in rents])))
+    rents = [r for r in rents if r[1] is not None and r[2] is not None]
+    rows = _pairs(rents, await _targets(session, University), 'university_id')
+    rows += _pairs(rents, await _targets(session, Faculty), 'faculty_id')
+    if rows:
+        await session.execute(insert(RentDistance), rows)
+    return len(rows)
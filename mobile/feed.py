@@ -0,0 +1,59 @@
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from cache import LRUCache
+from config import DB_REPLICA_CHECK_SECONDS, DB_REPLICA_MAX_LAG, FEED_CACHE_SIZE, FEED_CACHE_TTL
+from models.models import Rent
+
+# the replica can be up to DB_REPLICA_MAX_LAG behind, and one more check interval before it is marked down
+REPLICA_STALE_SECONDS = DB_REPLICA_MAX_LAG + DB_REPLICA_CHECK_SECONDS
+
+
+class FeedCache:
+    """Feed pages per gender, with their serialized bytes, for every student of that gender.
+
+    Writes bump the gender's generation instead of hunting down keys: entries under the old
+    generation are never read again and fall out of the LRU. Other workers only notice
+    through the TTL.
+    """
+
+    def __init__(self, maxsize: int, ttl: int):
+        self.entries = LRUCache(maxsize, ttl)
+        self.generations = {}
+        self.invalidated_at = {}
+        self.invalidations = 0
+
+    def key(self, jins_id, *params) -> tuple:
+        # take the key before querying, so a page built from pre-write data lands under the old generation
+        return (jins_id, self.generations.get(jins_id, 0), *params)
+
+    def get(self, key: tuple):
+        return self.entries.get(key)
+
+    def set(self, key: tuple, entry):
+        self.entries.set(key, entry)
+
+    def invalidate(self, *jins_ids):
+        """Call after the commit, or a reader could cache the old rows under the new generation."""
+        for jins_id in set(jins_ids) - {None}:
+            self.generations[jins_id] = self.generations.get(jins_id, 0) + 1
+            self.invalidated_at[jins_id] = time.monotonic()
+            self.invalidations += 1
+
+    def needs_primary(self, jins_id) -> bool:
+        """Whether a miss should read the primary: the replica may not have the write yet, and a
+        page built from it would be cached under the new generation for the whole TTL."""
+        invalidated_at = self.invalidated_at.get(jins_id)
+        return invalidated_at is not None and time.monotonic() - invalidated_at < REPLICA_STALE_SECONDS
+
+    def stats(self) -> dict:
+        return {**self.entries.stats(), 'invalidations': self.invalidations}
+
+
+async def rent_jins_id(session: AsyncSession, rent_id: int):
+    return (await session.execute(select(Rent.student_jins_id).where(Rent.id == rent_id))).scalar()
+
+
+feed_cache = FeedCache(FEED_CACHE_SIZE, FEED_CACHE_TTL)
@@ -0,0 +1,42 @@
+from sqlalchemy import and_
+
+from mobile.ratings import AVG_RATING
+from models.models import RENT_AMENITIES, Rent
+
+ALL_AMENITIES = (1 << len(RENT_AMENITIES)) - 1
+
+
+def amenity_mask(names) -> int:
+    mask = 0
+    for name in names:
+        mask |= 1 << RENT_AMENITIES.index(name)
+    return mask
+
+
+def amenity_supersets(mask: int) -> list:
+    # every value that has all the bits of mask; at most 64, so an IN list a btree can seek
+    free = ALL_AMENITIES & ~mask
+    values, subset = [], free
+    while True:
+        values.append(mask | subset)
+        if subset == 0:
+            return values
+        subset = (subset - 1) & free
+
+
+def filter_rents(query, filters):
+    """Adds the FilterScheme conditions that were given to a rent query."""
+    conditions = []
+    if filters.from_price is not None:
+        conditions.append(Rent.total_price >= filters.from_price)
+    if filters.end_price is not None:
+        conditions.append(Rent.total_price <= filters.end_price)
+    if filters.rate is not None:
+        conditions.append(AVG_RATING >= filters.rate)
+    for name in ('category_id', 'room_count', 'student_count', 'contract', 'broker'):
+        value = getattr(filters, name)
+        if value is not None:
+            conditions.append(getattr(Rent, name) == value)
+    if filters.amenities:
+        conditions.append(Rent.amenities.in_(amenity_supersets(amenity_mask(filters.amenities))))
+    return query.where(and_(*conditions)) if conditions else query
@@ -0,0 +1,13 @@
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def distance_matrix(latitudes_a, longitudes_a, latitudes_b, longitudes_b) -> np.ndarray:
+    """Haversine km between every point of a (rows) and every point of b (columns)."""
+    lat_a = np.radians(np.asarray(latitudes_a, dtype=np.float64))[:, None]
+    lon_a = np.radians(np.asarray(longitudes_a, dtype=np.float64))[:, None]
+    lat_b = np.radians(np.asarray(latitudes_b, dtype=np.float64))[None, :]
+    lon_b = np.radians(np.asarray(longitudes_b, dtype=np.float64))[None, :]
+    a = np.sin((lat_b - lat_a) / 2) ** 2 + np.cos(lat_a) * np.cos(lat_b) * np.sin((lon_b - lon_a) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
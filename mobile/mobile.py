@@ -1,23 +1,36 @@
 import datetime
-import secrets
-from typing import List
+import os
+from typing import List, Literal, Union
 
-import aiofiles
-from fastapi import APIRouter, Depends, HTTPException, UploadFile
-from fastapi.responses import FileResponse
-from fastapi_pagination import Page, add_pagination, paginate
-# from fastapi_pagination.ext.sqlalchemy import paginate
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, Query, Request
+from fastapi.responses import FileResponse, Response
+from fastapi_pagination import Page, Params, add_pagination
+from fastapi_pagination.ext.sqlalchemy import paginate as sqlalchemy_paginate
 
-from sqlalchemy import select, insert, or_, and_, delete
-from sqlalchemy.exc import NoResultFound
+from sqlalchemy import select, insert, and_, delete, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from auth.utils import verify_token
-from database import get_async_session
+from auth.utils import verify_renter_token, verify_token, verify_stuff_token
+from config import MAX_IMAGES_PER_UPLOAD
+from database import engine, get_async_session, get_read_session, read_from_primary, replica
 from mobile.scheme import RentGETScheme, RentADDScheme, FilterScheme, ReviewPostScheme, RateGetScheme, \
-    WishlistGETScheme, AnnouncementPOSTScheme
-from models.models import Rent, Image, Rate, Wishlist
+    WishlistPage, AnnouncementPOSTScheme, RentCursorPage, RentNearbyScheme
+from mobile.distances import MAX_DISTANCE_KM, refresh_rent_distances
+from mobile.feed import feed_cache, rent_jins_id
+from mobile.filters import filter_rents
+from mobile.projection import rent_item, rent_items, rent_projection
+from mobile.ratings import add_rating
+from mobile.search import filter_search, rank_search
+from mobile.utils import order_rents, fetch_cursor_page
+from mobile.wishlist import fetch_wishlist_page, flag_wishlisted, flagged_items, toggle_wishlist, wishlisted_ids
+from models.models import Rent, Image, Rate, RentDistance, StoredFile
+from responses import list_adapter, model_response
+from storage.derivatives import ensure_derivative, schedule_derivatives
+from storage.serving import image_paths, image_response
+from storage.store import is_content_addressed, release_file, store_upload, store_uploads
+from storage.upload import StoredUpload
 
 from datetime import datetime, timedelta
 
@@ -26,43 +39,134 @@ mobile_router = APIRouter()
 
 @mobile_router.get('/rent')
 async def get_all_rent(
-        page: int = 1,
-        size: int = 10,
+        sort: Literal['new', 'price'] = 'new',
+        params: Params = Depends(),
         token: dict = Depends(verify_token),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_read_session)
 ) -> Page[RentGETScheme]:
     try:
         gender_id = token['jins_id']
-        query = select(Rent).options(
-            selectinload(Rent.jins),
-            selectinload(Rent.category),
-            selectinload(Rent.renter),
-            selectinload(Rent.image)
-        ).where(Rent.student_jins_id == gender_id)
-        rent = await session.execute(query)
-        rent_data = rent.scalars().all()
-        return paginate(rent_data)
+        key = feed_cache.key(gender_id, 'rent', params.page, params.size, sort)
+        entry = feed_cache.get(key)
+        if entry is None:
+            if feed_cache.needs_primary(gender_id):
+                read_from_primary(session)
+            query = rent_projection().where(Rent.student_jins_id == gender_id)
+            # two statements (count + page), both in Postgres
+            page = await sqlalchemy_paginate(session, order_rents(query, sort), params, transformer=rent_items,
+                                             unique=False)
+            entry = (page, page.model_dump_json().encode())
+            feed_cache.set(key, entry)
+        page, body = entry
+        # the cached page is shared by the gender, only pages with saved rents are serialized again
+        saved = await wishlisted_ids(session, token.get('user_id'), [item.id for item in page.items])
+        if saved:
+            body = page.model_copy(update={'items': [
+                item.model_copy(update={'is_wishlisted': True}) if item.id in saved else item for item in page.items
+            ]}).model_dump_json().encode()
+        return Response(body, media_type='application/json')
     except Exception as e:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
 add_pagination(mobile_router)
 
 
+@mobile_router.get('/feed-cache/stats')
+async def get_feed_cache_stats(token: dict = Depends(verify_stuff_token)):
+    return feed_cache.stats()
+
+
+@mobile_router.get('/db-pool/stats')
+async def get_db_pool_stats(token: dict = Depends(verify_stuff_token)):
+    return {'primary': engine.pool.stats(), 'replica': replica.stats()}
+
+
+@mobile_router.get('/rent/cursor', response_model=RentCursorPage)
+async def get_all_rent_cursor(
+        cursor: Union[str, None] = None,
+        size: int = Query(10, ge=1, le=100),
+        sort: Literal['new', 'price'] = 'new',
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_read_session)
+):
+    gender_id = token['jins_id']
+    query = rent_projection().where(Rent.student_jins_id == gender_id)
+    page = await fetch_cursor_page(session, query, sort, cursor, size)
+    await flag_wishlisted(session, token.get('user_id'), page['items'])
+    return model_response(RentCursorPage.model_validate(page))
+
+
+@mobile_router.get('/rent/nearby')
+async def get_nearby_rent(
+        faculty_id: int,
+        radius_km: float = Query(3, gt=0, le=MAX_DISTANCE_KM),
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_read_session)
+) -> Page[RentNearbyScheme]:
+    gender_id = token['jins_id']
+    # rent_distance is kept up to date on every write, so this is a range scan on (faculty_id, student_jins_id, distance)
+    query = rent_projection(RentDistance.distance).join(RentDistance, RentDistance.rent_id == Rent.id).where(
+        RentDistance.faculty_id == faculty_id,
+        RentDistance.student_jins_id == gender_id,
+        RentDistance.distance <= radius_km
+    ).order_by(RentDistance.distance, Rent.id)
+    page = await sqlalchemy_paginate(session, query, unique=False, transformer=flagged_items(
+        session, token.get('user_id'), lambda row: {**rent_item(row), 'distance': round(row.distance, 3)}))
+    return model_response(page)
+
+add_pagination(mobile_router)
+
+
+@mobile_router.post('/rent/filter')
+async def filter_rent(
+        filters: FilterScheme,
+        sort: Literal['new', 'price'] = 'new',
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_read_session)
+) -> Page[RentGETScheme]:
+    gender_id = token['jins_id']
+    query = filter_rents(rent_projection().where(Rent.student_jins_id == gender_id), filters)
+    page = await sqlalchemy_paginate(session, order_rents(query, sort), unique=False,
+                                     transformer=flagged_items(session, token.get('user_id')))
+    return model_response(page)
+
+add_pagination(mobile_router)
+
+
+@mobile_router.post('/rent/filter/cursor', response_model=RentCursorPage)
+async def filter_rent_cursor(
+        filters: FilterScheme,
+        cursor: Union[str, None] = None,
+        size: int = Query(10, ge=1, le=100),
+        sort: Literal['new', 'price'] = 'new',
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_read_session)
+):
+    gender_id = token['jins_id']
+    query = filter_rents(rent_projection().where(Rent.student_jins_id == gender_id), filters)
+    page = await fetch_cursor_page(session, query, sort, cursor, size)
+    await flag_wishlisted(session, token.get('user_id'), page['items'])
+    return model_response(RentCursorPage.model_validate(page))
+
+
 @mobile_router.get('/rent_by_id', response_model=RentGETScheme)
 async def get_all_rent_by_id(
         rent_id: int,
         token: dict = Depends(verify_token),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_read_session)
 ):
     try:
         gender_id = token['jins_id']
         if gender_id is None:
             raise HTTPException(status_code=404, detail='Not authenticated')
-        data = await session.execute(select(Rent).options(
-            selectinload(Rent.renter), selectinload(Rent.jins), selectinload(Rent.category)).where(
+        data = await session.execute(rent_projection().where(
             and_(Rent.id == rent_id, Rent.student_jins_id == token['jins_id'])
         ))
-        return data.scalars().one_or_none()
+        row = data.one_or_none()
+        if row is None:
+            return None
+        item, = await flag_wishlisted(session, token.get('user_id'), [rent_item(row)])
+        return model_response(RentGETScheme.model_validate(item))
     except Exception as e:
         raise HTTPException(status_code=401, detail='Not authenticated')
 
@@ -70,13 +174,17 @@ async def get_all_rent_by_id(
 @mobile_router.post('/add-rent')
 async def add_rent(
         data: RentADDScheme,
-        token: dict = Depends(verify_token),
+        token: dict = Depends(verify_renter_token),
         session: AsyncSession = Depends(get_async_session)
 ):
     try:
         renter_id = token['renter_id']
-        await session.execute(insert(Rent).values(**data.dict(), renter_id=renter_id))
+        res = await session.execute(insert(Rent).values(**data.dict(), renter_id=renter_id).returning(
+            Rent.id, Rent.latitude, Rent.longitude, Rent.student_jins_id))
+        rows = res.all()
+        await refresh_rent_distances(session, rows)
         await session.commit()
+        feed_cache.invalidate(*[row.student_jins_id for row in rows])
     except Exception as e:
         raise HTTPException(status_code=400, detail='Error inserting request')
 
@@ -86,25 +194,31 @@ async def add_rent(
 @mobile_router.get('/home/filters-news')
 async def rent_filter(
         token: dict = Depends(verify_token),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_read_session)
 ):
     jins_id = token.get('jins_id')
-    three_days_ago = datetime.now() - timedelta(days=3)
-
-    rents = select(Rent).options(
-        selectinload(Rent.jins),
-        selectinload(Rent.category),
-        selectinload(Rent.renter)
-    ).where(
-        Rent.created_at >= three_days_ago
-        , Rent.student_jins_id == jins_id
-    )
-
-    # Execute the query
-    result = await session.execute(rents)
-    rented_items = result.scalars().all()
-
-    return rented_items
+    key = feed_cache.key(jins_id, 'news')
+    entry = feed_cache.get(key)
+    if entry is None:
+        if feed_cache.needs_primary(jins_id):
+            read_from_primary(session)
+        three_days_ago = datetime.now() - timedelta(days=3)
+        query = rent_projection().where(
+            Rent.created_at >= three_days_ago,
+            Rent.student_jins_id == jins_id
+        ).order_by(Rent.created_at, Rent.id)
+        result = await session.execute(query)
+        items = list_adapter(RentGETScheme).validate_python(rent_items(result.all()))
+        entry = (items, list_adapter(RentGETScheme).dump_json(items))
+        feed_cache.set(key, entry)
+
+    items, body = entry
+    saved = await wishlisted_ids(session, token.get('user_id'), [item.id for item in items])
+    if saved:
+        body = list_adapter(RentGETScheme).dump_json([
+            item.model_copy(update={'is_wishlisted': True}) if item.id in saved else item for item in items
+        ])
+    return Response(body, media_type='application/json')
 
 
 @mobile_router.post('/add-image-rent')
@@ -114,30 +228,111 @@ async def add_image_rent(
         token: dict = Depends(verify_token),
         session: AsyncSession = Depends(get_async_session)
 ):
-    url = f'images/{image.filename}'
-    async with aiofiles.open(url, 'wb') as zipf:
-        content = await image.read()
-        await zipf.write(content)
-    hashcode = secrets.token_hex(32)
-    data = insert(Image).values(url=url, hashcode=hashcode, rent_id=rent_id)
+    stored = await store_upload(session, image)
+    data = insert(Image).values(url=stored.path, hashcode=stored.sha256, rent_id=rent_id)
     await session.execute(data)
+    jins_id = await rent_jins_id(session, rent_id)
     await session.commit()
+    feed_cache.invalidate(jins_id)
+    schedule_derivatives(stored.path, stored.sha256)
+    return {'success': True}
+
+
+@mobile_router.post('/add-images-rent')
+async def add_images_rent(
+        images: List[UploadFile],
+        rent_id: int,
+        token: dict = Depends(verify_renter_token),
+        session: AsyncSession = Depends(get_async_session)
+):
+    if len(images) > MAX_IMAGES_PER_UPLOAD:
+        raise HTTPException(status_code=400, detail=f'At most {MAX_IMAGES_PER_UPLOAD} images per request')
+    # checked before anything is written to the store
+    rent = (await session.execute(select(Rent.student_jins_id).where(
+        Rent.id == rent_id, Rent.renter_id == token['renter_id']))).first()
+    if rent is None:
+        raise HTTPException(status_code=404, detail='Rent not found')
+    results = await store_uploads(session, images)
+    stored = [result for result in results if isinstance(result, StoredUpload)]
+    if stored:
+        await session.execute(insert(Image).values(
+            [{'url': item.path, 'hashcode': item.sha256, 'rent_id': rent_id} for item in stored]))
+        await session.commit()
+        feed_cache.invalidate(rent.student_jins_id)
+        for item in {item.sha256: item for item in stored}.values():
+            schedule_derivatives(item.path, item.sha256)
+
+    statuses = []
+    for image, result in zip(images, results):
+        if isinstance(result, StoredUpload):
+            statuses.append({'filename': image.filename, 'success': True, 'hashcode': result.sha256})
+        else:
+            detail = result.detail if isinstance(result, HTTPException) else f'{result}'
+            statuses.append({'filename': image.filename, 'success': False, 'detail': detail})
+    return {'success': bool(stored), 'images': statuses}
+
+
+@mobile_router.delete('/delete-image-rent')
+async def delete_image_rent(
+        hashcode: str,
+        rent_id: int,
+        token: dict = Depends(verify_renter_token),
+        session: AsyncSession = Depends(get_async_session)
+):
+    owned = select(Rent.id).where(Rent.id == rent_id, Rent.renter_id == token['renter_id'])
+    result = await session.execute(
+        delete(Image).where(Image.hashcode == hashcode, Image.rent_id.in_(owned)).returning(Image.id))
+    deleted = len(result.all())
+    if not deleted:
+        raise HTTPException(status_code=404, detail='Image is not available!')
+    await release_file(session, hashcode, deleted)
+    jins_id = await rent_jins_id(session, rent_id)
+    await session.commit()
+    feed_cache.invalidate(jins_id)
     return {'success': True}
 
 
 @mobile_router.get('/image', response_class=FileResponse)
 async def get_image(
+        request: Request,
         hashcode: str,
+        size: Literal['original', 'thumb', 'medium', 'webp'] = 'original',
         token: dict = Depends(verify_token),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_read_session)
 ):
-    data = await session.execute(select(Image).where(Image.hashcode == hashcode))
-    image = data.scalars().first()
-    if image:
-        some_file_path = f"{image.url}"
-        return some_file_path
-    else:
-        raise HTTPException(status_code=400, detail='Image is not available!')
+    some_file_path = image_paths.get(hashcode)
+    stat_result = None
+    if some_file_path is not None:
+        try:
+            stat_result = os.stat(some_file_path)
+        except FileNotFoundError:
+            # released by another worker since we cached it
+            image_paths.pop(hashcode)
+    if stat_result is None:
+        # avatars (User.image, Renter.image) only have the stored_file row
+        data = await session.execute(select(func.coalesce(
+            select(Image.url).where(Image.hashcode == hashcode).limit(1).scalar_subquery(),
+            select(StoredFile.path).where(StoredFile.sha256 == hashcode).scalar_subquery())))
+        some_file_path = data.scalar()
+        if some_file_path is None:
+            raise HTTPException(status_code=400, detail='Image is not available!')
+        try:
+            stat_result = os.stat(some_file_path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=400, detail='Image is not available!')
+        image_paths.set(hashcode, some_file_path)
+
+    immutable = is_content_addressed(some_file_path, hashcode)
+    if size != 'original':
+        try:
+            path = await ensure_derivative(some_file_path, hashcode, size)
+            return image_response(request, path, os.stat(path), f'"{hashcode}-{size}"', immutable, 'image/webp')
+        except Exception:
+            # Pillow cannot decode it (e.g. heic without a plugin): the original still works,
+            # and failed_renders keeps the next request off the pool
+            pass
+    etag = f'"{hashcode}"' if immutable else f'"{hashcode}-{int(stat_result.st_mtime)}-{stat_result.st_size}"'
+    return image_response(request, some_file_path, stat_result, etag, immutable)
 
 
 @mobile_router.post('/add-review')
@@ -151,6 +346,7 @@ async def add_review(
             insert(Rate).values(
                 **review_data.dict(), user_id=token['user_id'])
         )
+        await add_rating(session, review_data.rent_id, review_data.rate)
         await session.commit()
         return {'review_data': review_data}
     except HTTPException as e:
@@ -161,7 +357,7 @@ async def add_review(
 async def get_rents_review(
         rent_id: int,
         token: dict = Depends(verify_token),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_read_session)
 ):
     query = select(Rate).options(selectinload(Rate.user)).where(Rate.rent_id == rent_id)
     data = await session.execute(query)
@@ -176,51 +372,57 @@ async def add_wishlist(
     session: AsyncSession = Depends(get_async_session)
 ):
     user_id = token['user_id']
-    wishlist_data = await session.execute(
-        select(Wishlist).options(selectinload(Wishlist.rent), selectinload(Wishlist.user)).where(
-            and_(Wishlist.rent_id == rent_id, Wishlist.user_id == user_id)
-        ))
-    wish_data = wishlist_data.scalars().one_or_none()
-    if wish_data:
-        await session.execute(delete(Wishlist).where(and_(Wishlist.rent_id==rent_id, Wishlist.user_id==user_id)))
-    else:
-        await session.execute(insert(Wishlist).values(user_id=user_id, rent_id=rent_id))
-    await session.commit()
-    return {'success': True}
+    try:
+        wishlisted = await toggle_wishlist(session, user_id, rent_id)
+        await session.commit()
+    except IntegrityError:
+        raise HTTPException(status_code=404, detail='Rent is not available!')
+    return {'success': True, 'wishlisted': wishlisted}
 
 
-@mobile_router.get('/get-wishlist', response_model=List[WishlistGETScheme])
+@mobile_router.get('/get-wishlist', response_model=WishlistPage)
 async def get_wishlist(
+        cursor: Union[str, None] = None,
+        size: int = Query(20, ge=1, le=100),
         token: dict = Depends(verify_token),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_read_session)
 ):
-    try:
-        query = select(Wishlist).options(selectinload(Wishlist.rent)).where(Wishlist.user_id == token['user_id'])
-        data = await session.execute(query)
-        return data
-    except NoResultFound:
-        raise HTTPException(status_code=404, detail='Wishlist is not available!')
+    page = await fetch_wishlist_page(session, token['user_id'], cursor, size)
+    return model_response(WishlistPage.model_validate(page))
 
 
 @mobile_router.get('/search-rents')
 async def get_all_rents(
         query: str,
         token: dict = Depends(verify_token),
-        session: AsyncSession = Depends(get_async_session)
+        session: AsyncSession = Depends(get_read_session)
 ) -> Page[RentGETScheme]:
     gender = token.get('jins_id')
-    search_query = f'%{query}%'
-    query_data = select(Rent).options(
-        selectinload(Rent.jins),
-        selectinload(Rent.category),
-        selectinload(Rent.renter)
-    ).where(and_(Rent.student_jins_id == gender, or_(Rent.name.ilike(search_query), Rent.description.ilike(search_query))))
-    data = await session.execute(query_data)
-    return paginate(data.scalars().all())
+    query_data = rent_projection().where(Rent.student_jins_id == gender)
+    query_data = rank_search(filter_search(query_data, query), query)
+    page = await sqlalchemy_paginate(session, query_data, unique=False,
+                                     transformer=flagged_items(session, token.get('user_id')))
+    return model_response(page)
 
 add_pagination(mobile_router)
 
 
+@mobile_router.get('/search-rents/cursor', response_model=RentCursorPage)
+async def get_all_rents_cursor(
+        query: str,
+        cursor: Union[str, None] = None,
+        size: int = Query(10, ge=1, le=100),
+        sort: Literal['new', 'price'] = 'new',
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_read_session)
+):
+    gender = token.get('jins_id')
+    query_data = rent_projection().where(Rent.student_jins_id == gender)
+    page = await fetch_cursor_page(session, filter_search(query_data, query), sort, cursor, size)
+    await flag_wishlisted(session, token.get('user_id'), page['items'])
+    return model_response(RentCursorPage.model_validate(page))
+
+
 @mobile_router.get('/add-announcement')
 async def add_announcement(
         data: AnnouncementPOSTScheme,
@@ -0,0 +1,60 @@
+from sqlalchemy import JSON, func, literal_column, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+
+from mobile.ratings import AVG_RATING
+from models.models import Category, Image, Jins, Rent, Renter
+
+RENT_COLUMNS = [
+    Rent.id, Rent.name, Rent.description, Rent.room_count, Rent.total_price, Rent.student_count,
+    Rent.location, Rent.latitude, Rent.longitude, Rent.wifi, Rent.conditioner, Rent.washing_machine,
+    Rent.TV, Rent.refrigerator, Rent.furniture, Rent.other_convenience,
+    AVG_RATING.label('avg_rating'), Rent.rating_count.label('review_count'),
+    # not in RentGETScheme, the cursor endpoints encode it
+    Rent.created_at,
+]
+
+# nested object -> its columns; only what the schemes show, the renter's password hash is never read
+NESTED_COLUMNS = {
+    'category': [Category.id, Category.name_uz, Category.name_ru],
+    'jins': [Jins.id, Jins.name_uz, Jins.name_ru],
+    'renter': [Renter.id, Renter.firstname, Renter.lastname, Renter.phone, Renter.image],
+}
+
+RENT_IMAGES = (
+    select(func.coalesce(
+        func.json_agg(aggregate_order_by(
+            func.json_build_object('id', Image.id, 'url', Image.url, 'hashcode', Image.hashcode), Image.id)),
+        literal_column("'[]'::json"), type_=JSON))
+    .where(Image.rent_id == Rent.id)
+    .correlate(Rent)
+    .scalar_subquery()
+)
+
+
+def rent_projection(*extra):
+    """Everything RentGETScheme needs in one statement, images as a JSON array.
+
+    Plain columns are selected rather than JSON objects: Postgres builds the select list for
+    every row it sorts, only the images subquery waits until after the LIMIT.
+    """
+    nested = [column.label(f'{name}__{column.key}') for name, columns in NESTED_COLUMNS.items() for column in columns]
+    return select(*RENT_COLUMNS, *nested, RENT_IMAGES.label('image'), *extra).select_from(Rent).outerjoin(
+        Category, Category.id == Rent.category_id).outerjoin(
+        Jins, Jins.id == Rent.student_jins_id).outerjoin(
+        Renter, Renter.id == Rent.renter_id)
+
+
+def rent_item(row) -> dict:
+    """A projection row as the dict RentGETScheme validates from."""
+    item = {}
+    for key, value in row._mapping.items():
+        name, _, field = key.partition('__')
+        if field:
+            item.setdefault(name, {})[field] = value
+        else:
+            item[key] = value
+    return item
+
+
+def rent_items(rows) -> list:
+    return [rent_item(row) for row in rows]
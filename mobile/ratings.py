@@ -0,0 +1,34 @@
+from sqlalchemy import Float, cast, func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.models import Rate, Rent
+
+# rent.rating_sum / rating_count are kept by add_review, so feeds read the average off the row
+AVG_RATING = cast(Rent.rating_sum, Float) / func.nullif(Rent.rating_count, 0)
+
+
+async def add_rating(session: AsyncSession, rent_id: int, rate: int):
+    """Counts one review into the rent's totals, in the caller's transaction."""
+    await session.execute(update(Rent).where(Rent.id == rent_id).values(
+        rating_sum=Rent.rating_sum + rate, rating_count=Rent.rating_count + 1))
+
+
+async def reconcile_ratings(session: AsyncSession, first_id: int, last_id: int) -> int:
+    """Recomputes the totals of rents with first_id < id <= last_id from rate; returns how many were off.
+
+    The rents are locked first, so an add_review running alongside either lands before the
+    recount and is part of it, or waits and adds on top of it. The caller commits.
+    """
+    await session.execute(select(Rent.id).where(Rent.id > first_id, Rent.id <= last_id).with_for_update())
+    totals = select(
+        Rent.id,
+        func.coalesce(func.sum(Rate.rate), 0).label('rating_sum'),
+        func.count(Rate.id).label('rating_count'),
+    ).outerjoin(Rate, Rate.rent_id == Rent.id).where(Rent.id > first_id, Rent.id <= last_id).group_by(Rent.id).subquery()
+    result = await session.execute(
+        update(Rent).where(
+            Rent.id == totals.c.id,
+            tuple_(Rent.rating_sum, Rent.rating_count).is_distinct_from(
+                tuple_(totals.c.rating_sum, totals.c.rating_count))
+        ).values(rating_sum=totals.c.rating_sum, rating_count=totals.c.rating_count))
+    return result.rowcount
@@ -1,4 +1,4 @@
-from typing import Union, List
+from typing import Union, List, Literal
 
 from pydantic import BaseModel, Field
 
@@ -52,6 +52,18 @@ class RentGETScheme(BaseModel):
     refrigerator: bool
     furniture: bool
     other_convenience: str
+    avg_rating: Union[float, None] = None
+    review_count: int = 0
+    is_wishlisted: bool = False
+
+
+class RentNearbyScheme(RentGETScheme):
+    distance: float
+
+
+class RentCursorPage(BaseModel):
+    items: List[RentGETScheme]
+    next_cursor: Union[str, None]
 
 
 class RentADDScheme(BaseModel):
@@ -75,15 +87,20 @@ class RentADDScheme(BaseModel):
 
 
 class FilterScheme(BaseModel):
-    from_price: Union[float, None]
-    end_price: Union[float, None]
-    rate: Union[int, None]
-    range: Union[int, None]
+    from_price: Union[float, None] = None
+    end_price: Union[float, None] = None
+    rate: Union[int, None] = Field(default=None, ge=0, le=5)
+    category_id: Union[int, None] = None
+    room_count: Union[int, None] = None
+    student_count: Union[int, None] = None
+    contract: Union[bool, None] = None
+    broker: Union[bool, None] = None
+    amenities: List[Literal['wifi', 'conditioner', 'washing_machine', 'TV', 'refrigerator', 'furniture']] = []
 
 
 class ReviewPostScheme(BaseModel):
     rent_id: int
-    rate: int = Field(gte=0, lte=5)
+    rate: int = Field(ge=0, le=5)
     comment: Union[str, None]
 
 
@@ -103,29 +120,18 @@ class RateGetScheme(BaseModel):
     user: UserInfo
 
 
-class RentScheme(BaseModel):
+class WishlistCardScheme(BaseModel):
     id: int
     name: str
-    description: str
-    category: CategoryScheme
-    room_count: int
     total_price: float
-    student_count: int
-    location: str
-    latitude: float
-    longitude: float
-    wifi: bool
-    conditioner: bool
-    washing_machine: bool
-    TV: bool
-    refrigerator: bool
-    furniture: bool
-    other_convenience: str
+    # fetched from /image with size=thumb
+    thumbnail_hashcode: Union[str, None] = None
+    distance: Union[float, None] = None
 
 
-class WishlistGETScheme(BaseModel):
-    id: int
-    rent: RentScheme
+class WishlistPage(BaseModel):
+    items: List[WishlistCardScheme]
+    next_cursor: Union[str, None]
 
 
 class AnnouncementPOSTScheme(BaseModel):
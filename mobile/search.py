@@ -0,0 +1,47 @@
+import re
+
+from sqlalchemy import func, literal, or_
+
+from models.models import Rent
+
+# same characters the search_vector column strips, see models.RENT_SEARCH_VECTOR
+APOSTROPHES = str.maketrans('', '', "'ʻʼ‘’`")
+MAX_TERMS = 8
+
+
+def search_terms(text: str) -> list:
+    return re.findall(r'\w+', text.translate(APOSTROPHES).lower())[:MAX_TERMS]
+
+
+def build_tsquery(terms: list):
+    # every term is a prefix match so results show up while the user is still typing
+    raw = ' & '.join(f'{term}:*' for term in terms)
+    return func.to_tsquery('simple', raw).op('||')(func.to_tsquery('russian', raw))
+
+
+def search_filter(text: str):
+    terms = search_terms(text)
+    if not terms:
+        return None
+    # the trigram branch catches typos the tsquery misses, both sides are GIN indexed
+    return or_(
+        Rent.search_vector.op('@@')(build_tsquery(terms)),
+        literal(' '.join(terms)).op('<%')(Rent.name),
+    )
+
+
+def search_rank(text: str):
+    terms = search_terms(text)
+    return (func.ts_rank_cd(Rent.search_vector, build_tsquery(terms))
+            + func.word_similarity(' '.join(terms), Rent.name))
+
+
+def rank_search(query, text: str):
+    if not search_terms(text):
+        return query.order_by(Rent.created_at.desc(), Rent.id.desc())
+    return query.order_by(search_rank(text).desc(), Rent.id.desc())
+
+
+def filter_search(query, text: str):
+    condition = search_filter(text)
+    return query if condition is None else query.where(condition)
@@ -0,0 +1,73 @@
+import base64
+import json
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from mobile.projection import rent_items
+from models.models import Rent
+
+# sort name -> (column, descending); Rent.id breaks ties so the order is total
+RENT_SORTS = {
+    'new': (Rent.created_at, True),
+    'price': (Rent.total_price, False),
+}
+
+
+def order_rents(query, sort: str):
+    column, descending = RENT_SORTS[sort]
+    if descending:
+        return query.order_by(column.desc(), Rent.id.desc())
+    return query.order_by(column.asc(), Rent.id.asc())
+
+
+def pack_cursor(*values) -> str:
+    raw = json.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def unpack_cursor(cursor: str) -> list:
+    """Raises ValueError or TypeError on anything that was not made by pack_cursor."""
+    return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+
+
+def encode_cursor(sort: str, rent) -> str:
+    value = rent.created_at.isoformat() if sort == 'new' else rent.total_price
+    return pack_cursor(sort, value, rent.id)
+
+
+def decode_cursor(cursor: str, sort: str):
+    try:
+        cursor_sort, value, rent_id = unpack_cursor(cursor)
+        if cursor_sort != sort:
+            raise ValueError(cursor_sort)
+        # the values go straight into the seek comparison, anything that is not the column's type is a 400
+        value = datetime.fromisoformat(value) if sort == 'new' else float(value)
+        return value, int(rent_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
+def seek_rents(query, sort: str, cursor):
+    column, descending = RENT_SORTS[sort]
+    # a NULL key fails every row comparison, and a page ending on one would leave no cursor to seek from
+    query = query.where(column.isnot(None))
+    if cursor is None:
+        return query
+    value, rent_id = decode_cursor(cursor, sort)
+    key = tuple_(column, Rent.id)
+    if descending:
+        return query.where(key < tuple_(value, rent_id))
+    return query.where(key > tuple_(value, rent_id))
+
+
+async def fetch_cursor_page(session: AsyncSession, query, sort: str, cursor, size: int):
+    query = seek_rents(query, sort, cursor or None)
+    # one extra row tells us whether there is a next page without a COUNT
+    query = order_rents(query, sort).limit(size + 1)
+    result = await session.execute(query)
+    rows = result.all()
+    next_cursor = encode_cursor(sort, rows[size - 1]) if len(rows) > size else None
+    return {'items': rent_items(rows[:size]), 'next_cursor': next_cursor}
@@ -0,0 +1,98 @@
+from fastapi import HTTPException
+from sqlalchemy import Integer, and_, bindparam, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from mobile.projection import rent_item
+from mobile.utils import pack_cursor, unpack_cursor
+from models.models import Image, Rent, RentDistance, User, Wishlist
+
+FIRST_IMAGE = (
+    select(Image.hashcode)
+    .where(Image.rent_id == Rent.id)
+    .order_by(Image.id)
+    .limit(1)
+    .correlate(Rent)
+    .scalar_subquery()
+)
+
+
+# postgresql insert() has no cache key in this SQLAlchemy, built as a construct it is compiled
+# again on every toggle, which cost more than the round trips it saves
+TOGGLE = text(
+    "WITH removed AS ("
+    " DELETE FROM wishlist WHERE user_id = :user_id AND rent_id = :rent_id RETURNING id"
+    "), added AS ("
+    " INSERT INTO wishlist (user_id, rent_id) SELECT :user_id, :rent_id WHERE NOT EXISTS (SELECT FROM removed)"
+    " ON CONFLICT ON CONSTRAINT uq_wishlist_user_rent DO NOTHING RETURNING id"
+    ") "
+    # nothing deleted means the row is there now, ours or a concurrent toggle's
+    "SELECT NOT EXISTS (SELECT FROM removed), EXISTS (SELECT FROM added)"
+).bindparams(bindparam('user_id', type_=Integer), bindparam('rent_id', type_=Integer))
+
+
+async def toggle_wishlist(session: AsyncSession, user_id: int, rent_id: int) -> bool:
+    """Removes the rent from the wishlist if it is there, adds it otherwise; returns whether it is saved now.
+
+    One statement: the DELETE ... RETURNING feeds the INSERT ... ON CONFLICT, so there is no
+    read-then-write window. The caller commits.
+    """
+    result = await session.execute(TOGGLE, {'user_id': user_id, 'rent_id': rent_id})
+    return result.first()[0]
+
+
+async def wishlisted_ids(session: AsyncSession, user_id, rent_ids) -> set:
+    if not user_id or not rent_ids:
+        return set()
+    result = await session.execute(
+        select(Wishlist.rent_id).where(Wishlist.user_id == user_id, Wishlist.rent_id.in_(rent_ids)))
+    return set(result.scalars())
+
+
+async def flag_wishlisted(session: AsyncSession, user_id, items: list) -> list:
+    """Sets is_wishlisted on a page of rent item dicts with one lookup."""
+    saved = await wishlisted_ids(session, user_id, [item['id'] for item in items])
+    for item in items:
+        item['is_wishlisted'] = item['id'] in saved
+    return items
+
+
+def flagged_items(session: AsyncSession, user_id, build=rent_item):
+    """A paginate transformer: builds the item dicts, then flags them."""
+    async def transformer(rows):
+        return await flag_wishlisted(session, user_id, [build(row) for row in rows])
+    return transformer
+
+
+def wishlist_cards(user_id: int):
+    """The saved rents as cards; distance is from the user's faculty, None when they have not set one."""
+    return select(
+        Wishlist.id.label('wishlist_id'), Rent.id, Rent.name, Rent.total_price,
+        FIRST_IMAGE.label('thumbnail_hashcode'), RentDistance.distance
+    ).select_from(Wishlist).join(
+        Rent, Rent.id == Wishlist.rent_id).join(
+        User, User.id == Wishlist.user_id).outerjoin(
+        RentDistance, and_(RentDistance.rent_id == Rent.id, RentDistance.faculty_id == User.faculty_id)
+    ).where(Wishlist.user_id == user_id)
+
+
+def decode_wishlist_cursor(cursor: str) -> int:
+    try:
+        kind, wishlist_id = unpack_cursor(cursor)
+        if kind != 'saved':
+            raise ValueError(kind)
+        return int(wishlist_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+
+
+async def fetch_wishlist_page(session: AsyncSession, user_id: int, cursor, size: int):
+    """Most recently saved first, seeking on the wishlist id."""
+    query = wishlist_cards(user_id)
+    if cursor:
+        query = query.where(Wishlist.id < decode_wishlist_cursor(cursor))
+    result = await session.execute(query.order_by(Wishlist.id.desc()).limit(size + 1))
+    rows = result.all()
+    next_cursor = pack_cursor('saved', rows[size - 1].wishlist_id) if len(rows) > size else None
+    items = [{**row._mapping, 'distance': None if row.distance is None else round(row.distance, 3)}
+             for row in rows[:size]]
+    return {'items': items, 'next_cursor': next_cursor}
@@ -1,8 +1,9 @@
 from sqlalchemy import (
     Column, ForeignKey, Integer, String,
     Text, TIMESTAMP,
-    MetaData, Boolean, Float
+    MetaData, Boolean, Float, Computed, Index, UniqueConstraint
 )
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 import datetime
@@ -10,6 +11,22 @@ import datetime
 Base = declarative_base()
 metadata = MetaData()
 
+# 'simple' keeps Uzbek (Latin and Cyrillic) words as typed, 'russian' adds Russian stems.
+# Apostrophe variants are stripped so o'zbek, oʻzbek and ozbek index the same way.
+RENT_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', translate(coalesce(name, ''), '''ʻʼ‘’`', '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple', translate(coalesce(location, ''), '''ʻʼ‘’`', '')), 'B') || "
+    "setweight(to_tsvector('simple', translate(coalesce(description, ''), '''ʻʼ‘’`', '')), 'C') || "
+    "setweight(to_tsvector('russian', coalesce(description, '')), 'C')"
+)
+
+# bit i of rent.amenities is set when RENT_AMENITIES[i] is true; never reorder, only append
+RENT_AMENITIES = ('wifi', 'conditioner', 'washing_machine', 'TV', 'refrigerator', 'furniture')
+RENT_AMENITY_BITS = ' | '.join(
+    f'(CASE WHEN "{name}" THEN {1 << bit} ELSE 0 END)' for bit, name in enumerate(RENT_AMENITIES)
+)
+
 
 class University(Base):
     __tablename__ = 'university'
@@ -32,7 +49,7 @@ class Faculty(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     name_uz = Column(String)
     name_ru = Column(String)
-    university_id = Column(Integer, ForeignKey("university.id"))
+    university_id = Column(Integer, ForeignKey("university.id"), index=True)
     longitude = Column(Float)
     latitude = Column(Float)
 
@@ -56,7 +73,7 @@ class District(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     name_ru = Column(String)
     name_uz = Column(String)
-    region_id = Column(Integer, ForeignKey('region.id'))
+    region_id = Column(Integer, ForeignKey('region.id'), index=True)
 
     region = relationship('Region', back_populates='district')
     user = relationship("User",back_populates='district')
@@ -79,7 +96,7 @@ class User(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     firstname = Column(String)
     lastname = Column(String)
-    phone = Column(String)
+    phone = Column(String, unique=True)
     jins_id = Column(Integer, ForeignKey('jins.id'))
     university_id = Column(Integer, ForeignKey("university.id"),nullable=True)
     faculty_id = Column(Integer, ForeignKey('faculty.id'),nullable=True)
@@ -136,7 +153,7 @@ class Rent(Base):
     total_price = Column(Float)
     student_jins_id = Column(Integer, ForeignKey('jins.id'))
     student_count = Column(Integer)
-    renter_id = Column(Integer, ForeignKey('renter.id'))
+    renter_id = Column(Integer, ForeignKey('renter.id'), index=True)
     location = Column(String)
     longitude = Column(Float)
     latitude = Column(Float)
@@ -147,8 +164,23 @@ class Rent(Base):
     refrigerator = Column(Boolean)
     furniture = Column(Boolean)
     other_convenience = Column(Text)
-    created_at = Column(TIMESTAMP, default=datetime.datetime.utcnow())
+    created_at = Column(TIMESTAMP, default=datetime.datetime.utcnow)
     updated_at = Column(TIMESTAMP)
+    search_vector = Column(TSVECTOR, Computed(RENT_SEARCH_VECTOR, persisted=True))
+    amenities = Column(Integer, Computed(RENT_AMENITY_BITS, persisted=True))
+    # totals of rate.rate for this rent, maintained by add_review (scripts/reconcile_rent_ratings rebuilds them)
+    rating_sum = Column(Integer, nullable=False, default=0, server_default='0')
+    rating_count = Column(Integer, nullable=False, default=0, server_default='0')
+
+    __table_args__ = (
+        Index('ix_rent_search_vector', 'search_vector', postgresql_using='gin'),
+        Index('ix_rent_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+        # the feed sorts: equality on the gender, then the sort key with id as the tiebreak (mobile.utils.RENT_SORTS)
+        Index('ix_rent_jins_created', 'student_jins_id', 'created_at', 'id'),
+        Index('ix_rent_jins_price', 'student_jins_id', 'total_price', 'id'),
+        # "has these amenities" is rewritten to amenities IN (every superset of the mask), see mobile.filters
+        Index('ix_rent_jins_amenities', 'student_jins_id', 'amenities'),
+    )
 
     wishlist = relationship("Wishlist", back_populates='rent')
     category = relationship("Category", back_populates='rent')
@@ -156,6 +188,7 @@ class Rent(Base):
     renter = relationship("Renter",back_populates='rent')
     rate = relationship('Rate',back_populates='rent')
     image = relationship('Image', back_populates='rent')
+    distance = relationship('RentDistance', back_populates='rent')
 
 
 class Rate(Base):
@@ -163,7 +196,7 @@ class Rate(Base):
     metadata = metadata
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('user.id'))
-    rent_id = Column(Integer, ForeignKey('rent.id'))
+    rent_id = Column(Integer, ForeignKey('rent.id'), index=True)
     rate = Column(Integer)
     comment = Column(String)
 
@@ -178,6 +211,11 @@ class Wishlist(Base):
     user_id = Column(Integer, ForeignKey('user.id'))
     rent_id = Column(Integer, ForeignKey('rent.id'))
 
+    __table_args__ = (
+        UniqueConstraint('user_id', 'rent_id', name='uq_wishlist_user_rent'),
+        Index('ix_wishlist_user_id', 'user_id', 'id'),
+    )
+
     rent = relationship('Rent', back_populates='wishlist')
     user = relationship('User', back_populates='wishlist')
 
@@ -186,13 +224,45 @@ class Image(Base):
     __tablename__ = 'image'
     metadata = metadata
     id = Column(Integer, primary_key=True, autoincrement=True)
-    rent_id = Column(Integer, ForeignKey('rent.id'))
+    rent_id = Column(Integer, ForeignKey('rent.id'), index=True)
     url = Column(String)
-    hashcode = Column(String, unique=True)
+    # sha256 of the bytes, shared by every row that points at the same stored file
+    hashcode = Column(String, index=True)
 
     rent = relationship('Rent', back_populates='image')
 
 
+class StoredFile(Base):
+    __tablename__ = 'stored_file'
+    metadata = metadata
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    sha256 = Column(String, unique=True)
+    path = Column(String)
+    size = Column(Integer)
+    content_type = Column(String)
+    refcount = Column(Integer, default=0)
+
+
+class RentDistance(Base):
+    __tablename__ = 'rent_distance'
+    metadata = metadata
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    rent_id = Column(Integer, ForeignKey('rent.id', ondelete='CASCADE'), index=True)
+    university_id = Column(Integer, ForeignKey('university.id', ondelete='CASCADE'), nullable=True)
+    faculty_id = Column(Integer, ForeignKey('faculty.id', ondelete='CASCADE'), nullable=True)
+    # copied from the rent so the gender filter is answered from the index alone
+    student_jins_id = Column(Integer)
+    distance = Column(Float)
+
+    __table_args__ = (
+        Index('ix_rent_distance_faculty', 'faculty_id', 'student_jins_id', 'distance', postgresql_include=['rent_id']),
+        Index('ix_rent_distance_university', 'university_id', 'student_jins_id', 'distance',
+              postgresql_include=['rent_id']),
+    )
+
+    rent = relationship('Rent', back_populates='distance')
+
+
 class AnnouncementType(Base):
     __tablename__ = 'announcement_type'
     metadata = metadata
@@ -216,6 +286,16 @@ class Announcement(Base):
     user = relationship('User', back_populates='announcement')
 
 
+class RevokedToken(Base):
+    __tablename__ = 'revoked_token'
+    metadata = metadata
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # a token jti, or 'user:<id>' / 'renter:<id>' / 'stuff:<id>' for every token of that subject issued before revoked_at
+    jti = Column(String, index=True, unique=True)
+    revoked_at = Column(TIMESTAMP, default=datetime.datetime.utcnow, index=True)
+    expires_at = Column(TIMESTAMP, index=True)
+
+
 class Role(Base):
     __tablename__ = 'role'
     metadata=metadata
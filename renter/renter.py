@@ -6,12 +6,13 @@ from sqlalchemy import insert, select, and_
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from sqlalchemy.orm.sync import update
-
-from auth.utils import verify_token, verify_renter_token
-from database import get_async_session
+from auth.utils import verify_renter_token
+from database import get_async_session, get_read_session
+from mobile.distances import refresh_rent_distances
+from mobile.feed import feed_cache
 from models.models import Rent, Renter, Category
 from renter.scheme import Rent_scheme, My_rent_scheme, UpdateRentScheme
+from responses import list_response
 
 renter_router = APIRouter()
 
@@ -24,9 +25,13 @@ async def add_rent(model: Rent_scheme,
     try:
         renter_id = token.get('renter_id')
         print(renter_id)
-        query = insert(Rent).values(**dict(model), renter_id=renter_id)
-        await session.execute(query)
+        query = insert(Rent).values(**dict(model), renter_id=renter_id).returning(
+            Rent.id, Rent.latitude, Rent.longitude, Rent.student_jins_id)
+        res = await session.execute(query)
+        rows = res.all()
+        await refresh_rent_distances(session, rows)
         await session.commit()
+        feed_cache.invalidate(*[row.student_jins_id for row in rows])
         return HTTPException(status_code=200, detail="Rent added")
     except Exception as e:
         return HTTPException(status_code=400, detail=f"{e}")
@@ -34,52 +39,30 @@ async def add_rent(model: Rent_scheme,
 
 @renter_router.get('/renter/get_rents', response_model=List[My_rent_scheme])
 async def get_rents(token: dict = Depends(verify_renter_token),
-                    session: AsyncSession = Depends(get_async_session)):
+                    session: AsyncSession = Depends(get_read_session)):
     try:
         renter_id = token.get('renter_id')
         if renter_id is None:
             raise HTTPException(status_code=404, detail="Not authenticated")
-        query = select(Rent).where(Rent.renter_id == renter_id)
+        query = select(
+            Rent.id, Rent.name, Rent.description, Rent.room_count, Rent.total_price, Rent.student_jins_id,
+            Rent.student_count, Rent.contract, Rent.category_id, Rent.location, Rent.longitude, Rent.latitude,
+            Rent.wifi, Rent.conditioner, Rent.washing_machine, Rent.TV, Rent.refrigerator, Rent.furniture,
+            Rent.other_convenience, Renter.firstname, Renter.lastname, Renter.phone
+        ).join(Renter, Renter.id == Rent.renter_id).where(Rent.renter_id == renter_id)
         res = await session.execute(query)
-        result = res.scalars().all()
+        result = res.all()
         if not result:
             raise HTTPException(status_code=200, detail="You do not have any rents")
 
-        query_renter = select(Renter).where(Renter.id == renter_id)
-        res_renter = await session.execute(query_renter)
-        result_renter = res_renter.first()
-        renter_dict = {
-            'firstname': result_renter[0].firstname,
-            'lastname': result_renter[0].lastname,
-            'phone': result_renter[0].phone
-        }
-
         list_rents = []
-        for item in result:
-            list_rents.append({
-                'id': item.id,
-                'name': item.name,
-                'description': item.description,
-                'room_count': item.room_count,
-                'total_price': item.total_price,
-                'student_jins_id': item.student_jins_id,
-                'renter_id': renter_dict,
-                'student_count': item.student_count,
-                'contract': item.contract,
-                'category_id': item.category_id,
-                'location': item.location,
-                'longitude': item.longitude,
-                'latitude': item.latitude,
-                'wifi': item.wifi,
-                'conditioner': item.conditioner,
-                'washing_machine': item.washing_machine,
-                'TV': item.TV,
-                'refrigerator': item.refrigerator,
-                'furniture': item.furniture,
-                'other_convenience': item.other_convenience
-            })
+        for row in result:
+            item = row._asdict()
+            item['renter_id'] = {'firstname': item.pop('firstname'), 'lastname': item.pop('lastname'),
+                                 'phone': item.pop('phone')}
+            list_rents.append(item)
 
-        return list_rents
+        return list_response(My_rent_scheme, list_rents)
 
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"{e}")
@@ -88,7 +71,7 @@ async def get_rents(token: dict = Depends(verify_renter_token),
 @renter_router.put('/renter/renter/edit')
 async def edit_rent(rent_id: int,
                     model: UpdateRentScheme,
-                    token: dict = Depends(verify_token),
+                    token: dict = Depends(verify_renter_token),
                     session: AsyncSession = Depends(get_async_session)):
     try:
         renter_id = token.get('renter_id')
@@ -102,11 +85,17 @@ async def edit_rent(rent_id: int,
             raise HTTPException(status_code=404, detail="Rent not found")
 
         elif existing_rent:
+            old_location = (existing_rent.latitude, existing_rent.longitude)
             for fields, values in model.dict().items():
                 if values:
                     setattr(existing_rent, fields, values)
             setattr(existing_rent, 'updated_at', datetime.datetime.now())
+            jins_id = existing_rent.student_jins_id
+            if (existing_rent.latitude, existing_rent.longitude) != old_location:
+                await refresh_rent_distances(session, [(existing_rent.id, existing_rent.latitude,
+                                                        existing_rent.longitude, jins_id)])
             await session.commit()
+            feed_cache.invalidate(jins_id)
             return existing_rent
         else:
             raise HTTPException(status_code=400, detail="No fields to update")
@@ -83,4 +83,7 @@ class UpdateRentScheme(BaseModel):
     refrigerator: Union[bool, None]= None
     furniture: Union[bool, None]= None
     other_convenience: Union[str, None]= None
+    location: Union[str, None] = None
+    latitude: Union[float, None] = None
+    longitude: Union[float, None] = None
 
@@ -0,0 +1,27 @@
+from functools import lru_cache
+from typing import List
+
+from fastapi.responses import Response
+from pydantic import BaseModel, TypeAdapter
+
+JSON = 'application/json'
+
+
+def model_response(model: BaseModel) -> Response:
+    """The model as JSON straight from pydantic-core.
+
+    FastAPI would validate the returned model against the response_model again and walk the result
+    through its encoder before rendering; a model we just built needs neither.
+    """
+    return Response(model.model_dump_json(), media_type=JSON)
+
+
+@lru_cache(maxsize=None)
+def list_adapter(scheme) -> TypeAdapter:
+    return TypeAdapter(List[scheme])
+
+
+def list_response(scheme, items, from_attributes: bool = False) -> Response:
+    adapter = list_adapter(scheme)
+    return Response(adapter.dump_json(adapter.validate_python(items, from_attributes=from_attributes)),
+                    media_type=JSON)
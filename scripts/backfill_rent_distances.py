@@ -0,0 +1,34 @@
+# Rebuilds rent_distance for every rent, in id order and one commit per batch.
+# Run it once after the migration and again whenever universities or faculties are edited.
+#
+#   python -m scripts.backfill_rent_distances
+import asyncio
+import sys
+
+from sqlalchemy import select
+
+from database import async_session_maker, engine
+from mobile.distances import refresh_rent_distances
+from models.models import Rent
+
+
+async def main(batch_size: int):
+    last_id, rents_done, rows_written = 0, 0, 0
+    async with async_session_maker() as session:
+        while True:
+            res = await session.execute(
+                select(Rent.id, Rent.latitude, Rent.longitude, Rent.student_jins_id)
+                .where(Rent.id > last_id).order_by(Rent.id).limit(batch_size))
+            rents = res.all()
+            if not rents:
+                break
+            rows_written += await refresh_rent_distances(session, rents)
+            await session.commit()
+            last_id = rents[-1][0]
+            rents_done += len(rents)
+    await engine.dispose()
+    print(f'{rents_done} rents, {rows_written} distance rows')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000))
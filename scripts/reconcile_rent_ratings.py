@@ -0,0 +1,27 @@
+# Rebuilds rent.rating_sum / rating_count from the rate table, in id ranges with one commit each.
+# add_review keeps them current; run this after editing or deleting reviews by hand.
+#
+#   python -m scripts.reconcile_rent_ratings
+import asyncio
+import sys
+
+from sqlalchemy import func, select
+
+from database import async_session_maker, engine
+from mobile.ratings import reconcile_ratings
+from models.models import Rent
+
+
+async def main(batch_size: int):
+    fixed = 0
+    async with async_session_maker() as session:
+        max_id = (await session.execute(select(func.max(Rent.id)))).scalar() or 0
+        for first_id in range(0, max_id, batch_size):
+            fixed += await reconcile_ratings(session, first_id, first_id + batch_size)
+            await session.commit()
+    await engine.dispose()
+    print(f'rents up to id {max_id} checked, {fixed} corrected')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000))
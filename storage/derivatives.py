@@ -0,0 +1,120 @@
+import asyncio
+import multiprocessing
+import os
+import secrets
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from PIL import Image as PILImage, ImageOps
+
+from cache import LRUCache
+from config import FAILED_RENDER_TTL, IMAGE_DIR, IMAGE_WORKERS
+
+# longest side in pixels, None keeps the original size; every variant is WebP
+SIZES = {'thumb': 320, 'medium': 1024, 'webp': None}
+WEBP_QUALITY = 80
+
+_executor = None
+_pending = {}
+_tasks = set()
+# sha256 -> why the source does not decode; every size decodes the same source, so one failure covers them all
+failed_renders = LRUCache(10000, FAILED_RENDER_TTL)
+
+
+class RenderFailed(Exception):
+    """The source bytes do not decode as an image; retrying will not help."""
+
+
+def derivative_path(sha256: str, size: str) -> str:
+    return os.path.join(IMAGE_DIR, sha256[:2], sha256[2:4], f'{sha256}.{size}.webp')
+
+
+def _render(source: str, target: str, max_side):
+    # runs in a worker process: decoding and resampling a 12 MP photo holds the GIL for a long time
+    try:
+        image = PILImage.open(source)
+        image.load()
+    except FileNotFoundError:
+        raise
+    except OSError as e:
+        # UnidentifiedImageError and truncated data are OSErrors too
+        raise RenderFailed(f'{e}')
+    with image:
+        image = ImageOps.exif_transpose(image)
+        if max_side:
+            image.thumbnail((max_side, max_side), PILImage.LANCZOS)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f'{target}.{secrets.token_hex(4)}.tmp'
+        image.save(temp_path, 'WEBP', quality=WEBP_QUALITY, method=4)
+    os.replace(temp_path, target)
+    return target
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn, not fork: the server process already runs threads (bcrypt pool, asyncpg)
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    return _executor
+
+
+async def _run_render(source: str, target: str, max_side):
+    global _executor
+    pool = _pool()
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, _render, source, target, max_side)
+    except BrokenProcessPool:
+        # a dead worker leaves the executor refusing all work, the next render starts a fresh one
+        if _executor is pool:
+            _executor = None
+            pool.shutdown(wait=False)
+        raise
+
+
+async def ensure_derivative(source: str, sha256: str, size: str) -> str:
+    """Returns the variant's path, rendering it first if it does not exist yet."""
+    target = derivative_path(sha256, size)
+    if os.path.exists(target):
+        return target
+    error = failed_renders.get(sha256)
+    if error is not None:
+        raise RenderFailed(error)
+    # concurrent requests for the same variant wait on one render
+    future = _pending.get(target)
+    if future is None:
+        future = asyncio.ensure_future(_run_render(source, target, SIZES[size]))
+        _pending[target] = future
+        future.add_done_callback(lambda _: _pending.pop(target, None))
+    try:
+        return await asyncio.shield(future)
+    except RenderFailed as e:
+        # other errors (a crashed worker, a full disk) are worth another try on the next request
+        failed_renders.set(sha256, f'{e}')
+        raise
+
+
+async def _render_all(source: str, sha256: str):
+    for size in SIZES:
+        try:
+            await ensure_derivative(source, sha256, size)
+        except Exception as e:
+            # every size decodes the same source, the others would fail the same way
+            print(f'Derivative {size} of {sha256} failed: {e}')
+            return
+
+
+def schedule_derivatives(source: str, sha256: str):
+    """Renders every variant in the background; call after the upload is committed."""
+    task = asyncio.create_task(_render_all(source, sha256))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def remove_derivatives(sha256: str):
+    for size in SIZES:
+        try:
+            os.remove(derivative_path(sha256, size))
+        except FileNotFoundError:
+            pass
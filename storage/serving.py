@@ -0,0 +1,75 @@
+import mimetypes
+import os
+
+import aiofiles
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+from cache import LRUCache
+from config import IMAGE_PATH_CACHE_SIZE, UPLOAD_CHUNK_SIZE
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# hashcode -> Image.url, so repeat fetches do not touch the database
+image_paths = LRUCache(IMAGE_PATH_CACHE_SIZE)
+
+
+def _matches(header: str, etag: str) -> bool:
+    tags = [tag.strip() for tag in header.split(',')]
+    return '*' in tags or etag in tags or f'W/{etag}' in tags
+
+
+def parse_range(header: str, size: int):
+    """Returns (start, end) inclusive, None when the range cannot be satisfied, False to ignore the header."""
+    unit, _, spec = header.partition('=')
+    if unit.strip() != 'bytes' or ',' in spec:
+        # multipart ranges are not worth it for images, the full body is a valid answer
+        return False
+    first, _, last = spec.strip().partition('-')
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1
+    except ValueError:
+        return False
+    if start > end and first and last:
+        return False
+    if start >= size or size == 0:
+        return None
+    return start, min(end, size - 1)
+
+
+async def _read_range(path: str, start: int, end: int):
+    async with aiofiles.open(path, 'rb') as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(UPLOAD_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def image_response(request: Request, path: str, stat_result: os.stat_result, etag: str, immutable: bool,
+                   media_type: str = None) -> Response:
+    headers = {'ETag': etag, 'Accept-Ranges': 'bytes', 'Cache-Control': IMMUTABLE if immutable else 'no-cache'}
+    if_none_match = request.headers.get('if-none-match')
+    if if_none_match and _matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header and (if_range is None or if_range == etag):
+        size = stat_result.st_size
+        byte_range = parse_range(range_header, size)
+        if byte_range is None:
+            return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+        if byte_range:
+            start, end = byte_range
+            headers.update({'Content-Range': f'bytes {start}-{end}/{size}', 'Content-Length': str(end - start + 1)})
+            return StreamingResponse(_read_range(path, start, end), status_code=206, headers=headers,
+                                     media_type=media_type or mimetypes.guess_type(path)[0])
+    return FileResponse(path, headers=headers, media_type=media_type, stat_result=stat_result)
@@ -0,0 +1,140 @@
+import asyncio
+import os
+from collections import Counter
+from typing import List
+
+import aiofiles.os
+from fastapi import UploadFile
+from sqlalchemy import String, bindparam, delete, event, select, text, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config import IMAGE_DIR, MAX_UPLOAD_SIZE
+from database import async_session_maker
+from models.models import StoredFile
+from storage.derivatives import remove_derivatives
+from storage.serving import image_paths
+from storage.upload import StoredUpload, discard, stream_to_temp
+
+# session.info keys, sha256 -> path; the session hooks at the bottom act on them once the transaction ends
+CREATED = 'stored_files_created'
+RELEASED = 'stored_files_released'
+
+# held until the transaction ends; serializes the look at the disk between uploads and collect_files
+FILE_LOCKS = text(
+    "SELECT pg_advisory_xact_lock(hashtext(sha256)) FROM (SELECT unnest(:shas) AS sha256 ORDER BY 1) AS files"
+).bindparams(bindparam('shas', type_=ARRAY(String)))
+
+_tasks = set()
+
+
+def is_content_addressed(path: str, sha256: str) -> bool:
+    # rows from before the store point at images/<filename>, which can still be overwritten
+    return path.startswith(content_path(sha256, ''))
+
+
+def content_path(sha256: str, extension: str) -> str:
+    # two levels of 256 shards keep every directory small
+    return os.path.join(IMAGE_DIR, sha256[:2], sha256[2:4], f'{sha256}.{extension}')
+
+
+async def store_uploads(session: AsyncSession, images: List[UploadFile], max_size: int = MAX_UPLOAD_SIZE) -> list:
+    """Streams the uploads concurrently into the content-addressed store and takes a reference on each.
+
+    Returns a StoredUpload, or the exception that rejected it, per image in order. The refcount rows
+    are written with one upsert in the caller's transaction. Bytes already in the store are not moved
+    again, the temp copy is simply dropped.
+    """
+    results = await asyncio.gather(*(stream_to_temp(image, max_size) for image in images), return_exceptions=True)
+    staged = [result for result in results if not isinstance(result, BaseException)]
+    try:
+        if staged:
+            counts = Counter(stored.sha256 for _, stored in staged)
+            rows = {}
+            for _, stored in staged:
+                stored.path = content_path(stored.sha256, stored.extension)
+                rows[stored.sha256] = {'sha256': stored.sha256, 'path': stored.path, 'size': stored.size,
+                                       'content_type': stored.content_type, 'refcount': counts[stored.sha256]}
+            # sorted, so two batches sharing photos lock the rows in the same order
+            statement = insert(StoredFile).values([rows[sha256] for sha256 in sorted(rows)])
+            await session.execute(statement.on_conflict_do_update(
+                index_elements=[StoredFile.sha256],
+                set_={'refcount': StoredFile.refcount + statement.excluded.refcount}))
+            # a collect_files that is about to unlink one of these waits for our commit, or has already unlinked it
+            await session.execute(FILE_LOCKS, {'shas': sorted(rows)})
+        for temp_path, stored in staged:
+            if await aiofiles.os.path.exists(stored.path):
+                await discard(temp_path)
+            else:
+                await aiofiles.os.makedirs(os.path.dirname(stored.path), exist_ok=True)
+                await aiofiles.os.replace(temp_path, stored.path)
+                # removed again if the caller's transaction rolls back
+                session.info.setdefault(CREATED, {})[stored.sha256] = stored.path
+    except BaseException:
+        for temp_path, _ in staged:
+            await discard(temp_path)
+        raise
+    return [result if isinstance(result, BaseException) else result[1] for result in results]
+
+
+async def store_upload(session: AsyncSession, image: UploadFile, max_size: int = MAX_UPLOAD_SIZE) -> StoredUpload:
+    result, = await store_uploads(session, [image], max_size)
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+
+async def release_file(session: AsyncSession, sha256: str, count: int = 1):
+    """Drops references; the last one removes the row, and the file once the caller commits."""
+    result = await session.execute(
+        update(StoredFile).where(StoredFile.sha256 == sha256)
+        .values(refcount=StoredFile.refcount - count)
+        .returning(StoredFile.refcount, StoredFile.path))
+    row = result.first()
+    if row is not None and row.refcount <= 0:
+        await session.execute(delete(StoredFile).where(StoredFile.sha256 == sha256))
+        session.info.setdefault(RELEASED, {})[sha256] = row.path
+
+
+async def collect_files(files: dict):
+    """Unlinks the files of sha256 -> path that no committed stored_file row points at any more."""
+    try:
+        async with async_session_maker() as session:
+            await session.execute(FILE_LOCKS, {'shas': sorted(files)})
+            result = await session.execute(
+                select(StoredFile.sha256, StoredFile.path).where(StoredFile.sha256.in_(list(files))))
+            stored = dict(result.all())
+            for sha256, path in files.items():
+                if stored.get(sha256) != path:
+                    await discard(path)
+                if sha256 not in stored:
+                    remove_derivatives(sha256)
+                    image_paths.pop(sha256)
+            await session.commit()
+    except Exception as e:
+        print(f'Collecting stored files failed: {e}')
+
+
+def _collect_later(files: dict):
+    task = asyncio.get_running_loop().create_task(collect_files(files))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    session.info.pop(CREATED, None)
+    released = session.info.pop(RELEASED, None)
+    if released:
+        _collect_later(released)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _after_transaction_end(session, transaction):
+    # after_commit has already emptied both on a commit, so what is left was rolled back
+    if transaction.parent is None:
+        session.info.pop(RELEASED, None)
+        created = session.info.pop(CREATED, None)
+        if created:
+            _collect_later(created)
@@ -0,0 +1,79 @@
+import hashlib
+import os
+import secrets
+from dataclasses import dataclass
+
+import aiofiles
+import aiofiles.os
+from fastapi import HTTPException, UploadFile
+
+from config import IMAGE_DIR, MAX_UPLOAD_SIZE, UPLOAD_CHUNK_SIZE
+
+# magic bytes -> (content type, extension); the client's Content-Type header is not trusted
+SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png', 'png'),
+    (b'GIF87a', 'image/gif', 'gif'),
+    (b'GIF89a', 'image/gif', 'gif'),
+]
+
+
+@dataclass
+class StoredUpload:
+    path: str
+    sha256: str
+    size: int
+    content_type: str
+    extension: str
+
+
+def sniff_image(head: bytes):
+    for magic, content_type, extension in SIGNATURES:
+        if head.startswith(magic):
+            return content_type, extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp', 'webp'
+    if head[4:12] in (b'ftypheic', b'ftypheix', b'ftypmif1'):
+        return 'image/heic', 'heic'
+    return None
+
+
+async def discard(path: str):
+    try:
+        await aiofiles.os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+async def stream_to_temp(image: UploadFile, max_size: int = MAX_UPLOAD_SIZE):
+    """Copies the upload into a temp file under IMAGE_DIR chunk by chunk, hashing as it goes.
+
+    Returns (temp path, StoredUpload without a final path). The caller renames or discards the temp file.
+    """
+    if image.size is not None and image.size > max_size:
+        raise HTTPException(status_code=413, detail='Image is too large')
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    temp_path = os.path.join(IMAGE_DIR, f'.upload-{secrets.token_hex(8)}')
+    digest = hashlib.sha256()
+    size = 0
+    kind = None
+    try:
+        async with aiofiles.open(temp_path, 'wb') as out:
+            while chunk := await image.read(UPLOAD_CHUNK_SIZE):
+                if kind is None:
+                    kind = sniff_image(chunk)
+                    if kind is None:
+                        raise HTTPException(status_code=415, detail='Unsupported image type')
+                size += len(chunk)
+                if size > max_size:
+                    raise HTTPException(status_code=413, detail='Image is too large')
+                digest.update(chunk)
+                await out.write(chunk)
+        if kind is None:
+            raise HTTPException(status_code=400, detail='Empty file')
+    except BaseException:
+        await discard(temp_path)
+        raise
+    return temp_path, StoredUpload(path=None, sha256=digest.hexdigest(), size=size,
+                                   content_type=kind[0], extension=kind[1])
+